@@ -72,6 +72,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file rather than the shared in-memory database, which can't take
+        # writes from several threads at once (see the package ID tests)
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -121,3 +124,95 @@ STATICFILES_DIRS = [
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+
+
+# Geocoding (OpenCage)
+
+MY_API_KEY = os.environ.get('OPENCAGE_API_KEY', '')
+
+GEOCODE_CACHE_SIZE = 1024  # entries kept in each process
+GEOCODE_CACHE_TTL = 30 * 24 * 60 * 60  # seconds
+GEOCODE_NEGATIVE_CACHE_TTL = 24 * 60 * 60  # seconds, for queries with no results
+
+# Offline postal code index, built with `manage.py build_postcode_index`
+POSTCODE_INDEX_PATH = BASE_DIR / 'postcodes.idx'
+
+# Pricing, see globalwis/pricing.py for the units
+PRICING_DEFAULT_RATE_CARD = 'standard'
+PRICING_RATE_CARDS = {
+    'standard': {
+        'volumetric_divisor': 5000,
+        'volumetric_rate_cents': 100,
+        'rate_per_km_cents': 10,
+        'minimum_cents': 0,
+    },
+}
+BULK_QUOTE_MAX_PACKAGES = 10000
+
+QUOTE_TTL = 24 * 60 * 60  # seconds a quote can be turned into a shipment
+
+# purge_unassigned_packages leaves packages without a package_id and
+# shipment drafts alone for this long, so nothing is removed under a user
+# who is still going through the wizard
+UNASSIGNED_PACKAGE_GRACE = 2 * 24 * 60 * 60  # seconds
+
+# Package IDs: PREFIX + 8 base32 digits + check character. Each process
+# reserves BLOCK_SIZE sequence numbers at a time; unused ones are skipped
+# when the process exits, which only leaves gaps.
+PACKAGE_ID_PREFIX = 'GBW'
+PACKAGE_ID_BLOCK_SIZE = 1000
+
+# Key for the payment card fingerprints. Changing it orphans every stored
+# fingerprint, so it is kept apart from SECRET_KEY in production.
+PAYMENT_FINGERPRINT_KEY = os.environ.get('PAYMENT_FINGERPRINT_KEY', SECRET_KEY)
+
+MANAGE_SHIPMENTS_PAGE_SIZE = 50
+
+# Unfiltered admin changelists show the database's row estimate instead of
+# an exact COUNT(*) above this many rows (PostgreSQL only)
+ADMIN_EXACT_COUNT_LIMIT = 100000
+REPORT_CHUNK_SIZE = 2000  # rows fetched and written per chunk of the shipment export
+
+# Shipment photos (globalwis/images.py), stored by SHA-256 of their content.
+# Variants are WebP copies no larger than the given size, made by a pool of
+# IMAGE_WORKERS processes after the upload response has gone out.
+IMAGE_STORE_ROOT = BASE_DIR / 'media' / 'shipment_images'
+IMAGE_VARIANTS = {'thumb': 320, 'large': 1600}
+IMAGE_WORKERS = 2
+# None serves files from Django. Behind nginx use 'X-Accel-Redirect' with an
+# internal location mapping IMAGE_ACCEL_PREFIX to IMAGE_STORE_ROOT; behind
+# Apache with mod_xsendfile use 'X-Sendfile'.
+IMAGE_SENDFILE_HEADER = None
+IMAGE_ACCEL_PREFIX = '/protected/shipment_images/'
+
+# Outbound HTTP (globalwis/outbound.py), timeouts are (connect, read) seconds
+OUTBOUND_HTTP_POOL_CONNECTIONS = 10  # hosts kept in the pool
+OUTBOUND_HTTP_POOL_MAXSIZE = 20  # connections kept per host
+OUTBOUND_HTTP_TIMEOUTS = {
+    'default': (3.05, 10),
+    'api.opencagedata.com': (3.05, 5),
+    'newsapi.org': (3.05, 10),
+}
+
+# Circuit breaker around OpenCage, see globalwis/outbound.py
+GEOCODE_BREAKER_FAILURE_THRESHOLD = 5  # consecutive failures before opening
+GEOCODE_BREAKER_RESET_TIMEOUT = 30  # seconds before a trial call is let through
+
+# News feed, refreshed in the background by `manage.py refresh_news --loop`
+NEWS_API_KEY = os.environ.get('NEWS_API_KEY', '49d74ef14f3f44a69551d0325b121582')
+NEWS_KEYWORDS = ["delivery", "shipping", "logistics", "fulfillment", "couriers", "packages", "parcels", "express", "commerce", "supply "]
+NEWS_REFRESH_INTERVAL = 15 * 60  # seconds
+NEWS_RETENTION_DAYS = 7
+NEWS_PAGE_SIZE = 100
+
+# Public tracking API, seconds browsers and shared caches may reuse an answer
+TRACKING_API_MAX_AGE = 60
+TRACKING_BATCH_LIMIT = 500  # package ids per bulk tracking request
+
+# Live tracking stream. The in-process broker only reaches clients connected
+# to the same process; swap the backend when running several workers.
+TRACKING_BROKER_BACKEND = 'globalwis.broker.InProcessBroker'
+TRACKING_STREAM_HEARTBEAT = 15  # seconds between keep-alive comments
+TRACKING_STREAM_RETRY = 5000  # ms, reconnect delay suggested to browsers
+TRACKING_STREAM_MAX_AGE = 5 * 60  # seconds before a stream is closed and the browser reconnects
+TRACKING_STREAM_QUEUE_SIZE = 16  # pending updates kept per slow client
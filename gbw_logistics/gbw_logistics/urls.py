@@ -2,8 +2,10 @@ from django.contrib import admin
 from django.urls import path
 
 from globalwis import views
+from globalwis.admin import report_view
 
 urlpatterns = [
+    path('admin/report/shipments/', report_view, name='shipment_report'),
     path('admin/', admin.site.urls),
     # Swiftdrop App urls
     path('', views.HomeView.as_view(), name='home'),
@@ -19,13 +21,18 @@ urlpatterns = [
     path('quote/', views.QuotesCreateView.as_view(), {'action': 'create'}, name='quote'),
     path('create_shipment/', views.QuotesCreateView.as_view(), {'action': 'quote'}, name='create_shipment'),
     path('show-price/', views.show_price, name='show_price'),
+    path('quote/bulk/', views.bulk_quote, name='bulk_quote'),
     path('news/', views.news, name="news"),
-    path('payment/<int:shipment_id>/', views.PaymentView.as_view(), name="payment"),
+    path('geocode-stats/', views.geocode_stats, name="geocode_stats"),
+    path('payment/', views.PaymentView.as_view(), name="payment"),
     path('checkout/', views.CheckoutView.as_view(), name='checkout'),
     path('dashboard/', views.UserDashboardView.as_view(), name='dashboard'),
     path('profile/', views.profile_view, name="profile"),
     path('manage_shipments/', views.ManageShipmentView.as_view(), name="manage_shipments"),
     path('track_shipment/', views.TrackShipmentView.as_view(), name='track_shipment'),
+    path('api/track/', views.track_batch_api, name='track_batch_api'),
+    path('api/track/<str:package_id>/', views.track_api, name='track_api'),
+    path('api/track/<str:package_id>/stream/', views.track_stream, name='track_stream'),
     path('user_information/', views.ContactDetailView.as_view(), name='user_information'),
     path('user_information_update/', views.ContactCreateUpdateView.as_view(), name='user_information_update'),
     path('create_edit/', views.ContactCreateUpdateView.as_view(), name='create_edit'),
@@ -37,12 +44,14 @@ urlpatterns = [
 
     # Shipment detials
     path('shipment-details/', views.ShipmentDetailsView.as_view(), name='shipment_details'),
-    path('image_upload/<int:shipment_id>', views.ImageUploadView.as_view(), name='image_upload'),
-    path('packaging/<int:shipment_id>/', views.PackagingView.as_view(), name='packaging'),
+    path('image_upload/', views.ImageUploadView.as_view(), name='image_upload'),
+    path('images/<str:name>', views.shipment_image, name='shipment_image'),
+    path('packaging/', views.PackagingView.as_view(), name='packaging'),
     path('shipment-confirmation/', views.ShipmentConfirmationView.as_view(), name='shipment_confirmation'),
 
     # Location URLs
     path('locations/', views.LocationListView.as_view(), name='location_list'),
+    path('locations/package-counts/', views.PackageCountByLocationView.as_view(), name='package_count_by_location'),
     path('locations/create/', views.LocationCreateView.as_view(), name='location_create'),
     path('locations/<int:pk>/', views.LocationDetailView.as_view(), name='location_detail'),
     path('locations/<int:pk>/update/', views.LocationUpdateView.as_view(), name='location_update'),
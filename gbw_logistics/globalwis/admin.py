@@ -1,19 +1,130 @@
+import csv
+import io
+import json
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.models import User
-from django.db import models
-from .models import Checkout, Package, LocationDistance, Shipment, Packaging, Contact, Payment, Location, Stations
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, models
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django_countries import countries
+from .models import Checkout, Package, LocationDistance, GeocodeCache, Quote, NewsArticle, Shipment, ShipmentEvent, UserShipmentStats, PackageCountByLocation, ShipmentDraft, Packaging, Contact, Payment, Location, Stations
 from django.contrib.auth.decorators import user_passes_test
 
+
+class EstimatedCountPaginator(Paginator):
+    # An exact COUNT(*) scans the whole table on every changelist page. For
+    # an unfiltered list use the planner's row estimate once the table is
+    # big enough that nobody needs the exact figure.
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if not queryset.query.where and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] > settings.ADMIN_EXACT_COUNT_LIMIT:
+                return row[0]
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class FixedValuesFilter(admin.SimpleListFilter):
+    # Options from a fixed list. A plain field in list_filter runs a SELECT
+    # DISTINCT over the whole table on every changelist load.
+    values = ()
+
+    def lookups(self, request, model_admin):
+        return self.values
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.parameter_name: self.value()})
+        return queryset
+
+
+# Shipments store the country name
+COUNTRY_NAMES = [(str(name), name) for code, name in countries]
+
+
+class StatusFilter(FixedValuesFilter):
+    title = 'status'
+    parameter_name = 'status'
+    values = ShipmentEvent.STATUS_CHOICES
+
+
+class OriginFilter(FixedValuesFilter):
+    title = 'origin'
+    parameter_name = 'origin'
+    values = COUNTRY_NAMES
+
+
+class DestinationFilter(FixedValuesFilter):
+    title = 'destination'
+    parameter_name = 'destination'
+    values = COUNTRY_NAMES
+
+
+@admin.register(Shipment)
+class ShipmentAdmin(LargeTableAdmin):
+    list_display = ('id', 'package', 'status', 'origin', 'destination', 'date')
+    list_select_related = ('package',)
+    list_filter = (StatusFilter, 'date', OriginFilter, DestinationFilter)
+    search_fields = ('=package__package_id',)
+    raw_id_fields = ('package', 'contact_info', 'drop_off_location', 'pick_up_location', 'packaging', 'payment', 'latest_event')
+
+
+@admin.register(Checkout)
+class CheckoutAdmin(LargeTableAdmin):
+    list_display = ('id', 'package', 'sender_name', 'receiver_name', 'sender_pickup_country', 'receiver_delivery_country')
+    list_select_related = ('package',)
+    search_fields = ('=package__package_id',)
+    raw_id_fields = ('package',)
+
+
+@admin.register(Package)
+class PackageAdmin(LargeTableAdmin):
+    list_display = ('id', 'package_id', 'sender', 'pickup_country', 'delivery_country', 'weight', 'created_at')
+    list_select_related = ('sender',)
+    list_filter = ('created_at',)
+    search_fields = ('=package_id',)
+    raw_id_fields = ('sender', 'quote')
+
+
+@admin.register(ShipmentEvent)
+class ShipmentEventAdmin(LargeTableAdmin):
+    list_display = ('id', 'shipment', 'status', 'timestamp')
+    raw_id_fields = ('shipment',)
+
+    def get_queryset(self, request):
+        # __str__ of the shipment goes through package.sender
+        return super().get_queryset(request).select_related('shipment__package__sender')
+
+
 # Register your models here.
-admin.site.register(Checkout)
 admin.site.register(Packaging)
 admin.site.register(Location)
 admin.site.register(Stations)
-admin.site.register(Shipment)
-admin.site.register(Package)
 admin.site.register(Contact)
 admin.site.register(Payment)
 admin.site.register(LocationDistance)
+admin.site.register(GeocodeCache)
+admin.site.register(Quote)
+admin.site.register(NewsArticle)
+admin.site.register(UserShipmentStats)
+admin.site.register(PackageCountByLocation)
+admin.site.register(ShipmentDraft)
 
 
 
@@ -23,9 +134,97 @@ class Admin(User):
 
 
 def is_admin(user):
-    return user.is_authenticated and user.is_admin
+    # Superusers, or users flagged in the Admin table
+    if not user.is_authenticated:
+        return False
+    return user.is_superuser or Admin.objects.filter(pk=user.pk, is_admin=True).exists()
+
+
+REPORT_COLUMNS = {
+    'id': 'id',
+    'package_id': 'package__package_id',
+    'status': 'status',
+    'origin': 'origin',
+    'destination': 'destination',
+    'date': 'date',
+    'weight': 'weight',
+    'value': 'value',
+    'sender_name': 'contact_info__sender_name',
+    'sender_email': 'contact_info__sender_email',
+    'receiver_name': 'contact_info__receiver_name',
+    'receiver_email': 'contact_info__receiver_email',
+}
+
+
+def report_queryset(params):
+    # Shipments matching the report filters: date_from, date_to (YYYY-MM-DD,
+    # inclusive), status, origin, destination. Raises ValueError on bad input.
+    queryset = Shipment.objects.all()
+    # Day bounds as datetimes so the date index is usable
+    if params.get('date_from'):
+        start = date.fromisoformat(params['date_from'])
+        queryset = queryset.filter(date__gte=timezone.make_aware(datetime.combine(start, time.min)))
+    if params.get('date_to'):
+        end = date.fromisoformat(params['date_to']) + timedelta(days=1)
+        queryset = queryset.filter(date__lt=timezone.make_aware(datetime.combine(end, time.min)))
+    for field in ('status', 'origin', 'destination'):
+        if params.get(field):
+            queryset = queryset.filter(**{field: params[field]})
+    return queryset.order_by('id').values_list(*REPORT_COLUMNS.values())
+
+
+def stream_report(rows, output, chunk_size):
+    # The CSV header goes out before the query runs. The first row is read
+    # on its own (LIMIT 1, so the database stops at the first match) and
+    # sent at once, which gives JSON lines an early first byte too. The rest
+    # is read after it by id and written one chunk at a time.
+    fields = list(REPORT_COLUMNS)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def write(row):
+        if output == 'csv':
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(dict(zip(fields, row)), cls=DjangoJSONEncoder) + '\n')
+
+    def flush():
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return value
+
+    if output == 'csv':
+        writer.writerow(fields)
+        yield flush()
+
+    first = list(rows[:1])
+    if not first:
+        return
+    write(first[0])
+    yield flush()
+
+    rest = rows.filter(id__gt=first[0][0])  # rows are ordered by id, its first column
+    for i, row in enumerate(rest.iterator(chunk_size=chunk_size)):
+        write(row)
+        if (i + 1) % chunk_size == 0:
+            yield flush()
+    yield flush()
+
 
 @user_passes_test(is_admin)
 def report_view(request):
-    # generate report
-    ...
+    # Shipment export as CSV (default) or JSON lines (?format=jsonl), streamed
+    # so memory stays flat whatever the size of the result
+    output = request.GET.get('format', 'csv')
+    if output not in ('csv', 'jsonl'):
+        return HttpResponseBadRequest('format must be csv or jsonl')
+    try:
+        rows = report_queryset(request.GET)
+    except ValueError as e:
+        return HttpResponseBadRequest(f'Invalid filter: {e}')
+
+    content_type = 'text/csv' if output == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(stream_report(rows, output, settings.REPORT_CHUNK_SIZE), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="shipments.{output}"'
+    return response
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SwiftdropConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'globalwis'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,66 @@
+import asyncio
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class InProcessBroker:
+    # Publish/subscribe within a single process. Good for development and for
+    # a single ASGI worker; a multi-process deployment needs a backend that
+    # goes through an external service, with the same publish/listen API.
+    #
+    # publish() can be called from any thread (signal handlers run in sync
+    # views), listen() runs on the event loop serving the connection.
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def publish(self, topic, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._deliver, queue, message)
+
+    @staticmethod
+    def _deliver(queue, message):
+        # A slow client loses its oldest update rather than holding up others
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(message)
+
+    async def listen(self, topic, heartbeat=None):
+        # Yields messages for `topic`, or None every `heartbeat` seconds of silence
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(maxsize=settings.TRACKING_STREAM_QUEUE_SIZE))
+        with self._lock:
+            self._subscribers.setdefault(topic, set()).add(subscriber)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(subscriber[1].get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(topic)
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[topic]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.TRACKING_BROKER_BACKEND)()
+    return _broker
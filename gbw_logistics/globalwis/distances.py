@@ -0,0 +1,70 @@
+import csv
+import threading
+from pathlib import Path
+
+from geopy import distance
+
+from . import postcodes
+from .geocoding import get_geocodes
+from .models import LocationDistance
+
+
+# Country centroids (ISO 3166 alpha-2), from the restcountries data shipped
+# with the countryinfo package (MIT).
+CENTROIDS_PATH = Path(__file__).resolve().parent / 'data' / 'country_centroids.csv'
+
+_matrix = None
+_matrix_lock = threading.Lock()
+
+
+def load_centroids(path=CENTROIDS_PATH):
+    with open(path, newline='', encoding='utf-8') as f:
+        return {row['code']: (float(row['lat']), float(row['lng'])) for row in csv.DictReader(f)}
+
+
+def load_matrix():
+    rows = LocationDistance.objects.values_list('pickup_country', 'delivery_country', 'distance_km')
+    return {(pickup, delivery): km for pickup, delivery, km in rows.iterator(chunk_size=5000)}
+
+
+def get_matrix():
+    # Loaded once per process, the first time a distance is needed
+    global _matrix
+    if _matrix is None:
+        with _matrix_lock:
+            if _matrix is None:
+                _matrix = load_matrix()
+    return _matrix
+
+
+def reset_matrix():
+    global _matrix
+    with _matrix_lock:
+        _matrix = None
+
+
+def get_distance(pickup_country, delivery_country):
+    return get_matrix().get((str(pickup_country).upper(), str(delivery_country).upper()))
+
+
+def offline_distance(pickup_country, delivery_country, pickup_zip=None, delivery_zip=None):
+    # Zip level when both postcodes are in the offline index, else country level
+    pickup_point = postcodes.lookup(pickup_country, pickup_zip)
+    delivery_point = postcodes.lookup(delivery_country, delivery_zip)
+    if pickup_point is not None and delivery_point is not None:
+        return distance.distance(pickup_point, delivery_point).km
+    return get_distance(pickup_country, delivery_country)
+
+
+def calculate_distance(pickup_country, delivery_country, api_key, pickup_zip=None, delivery_zip=None):
+    distance_km = offline_distance(pickup_country, delivery_country, pickup_zip, delivery_zip)
+    if distance_km is not None:
+        return distance_km
+
+    # Pair missing from the matrix (build_distance_matrix not run yet), geocode it
+    (pickup_lat, pickup_lng), (delivery_lat, delivery_lng) = get_geocodes([pickup_country, delivery_country], api_key)
+    if pickup_lat is None or delivery_lat is None:
+        return None
+    distance_km = distance.distance((pickup_lat, pickup_lng), (delivery_lat, delivery_lng)).km
+    get_matrix()[(str(pickup_country).upper(), str(delivery_country).upper())] = distance_km
+    return distance_km
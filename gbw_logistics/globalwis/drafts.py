@@ -0,0 +1,140 @@
+from django.db import transaction
+
+from .identity import assign, identity_map
+from .models import Contact, Package, ShipmentDraft, ShipmentEvent
+from .package_ids import new_package_id
+from .payments import get_or_create_payment
+
+
+# The create-shipment wizard keeps everything in one ShipmentDraft row per
+# session until the payment step. Each step stores what was submitted and
+# commit_draft writes all the rows in one transaction, so an abandoned flow
+# leaves nothing behind but its draft.
+
+# Steps in wizard order, with the view that fills each in. The image is optional.
+STEPS = [
+    ('package', 'create_shipment'),
+    ('checkout', 'checkout'),
+    ('shipment', 'shipment_details'),
+    ('image', 'image_upload'),
+    ('packaging', 'packaging'),
+]
+OPTIONAL_STEPS = {'image'}
+
+
+def get_draft(request):
+    session_key = request.session.session_key
+    if session_key is None:
+        return None
+    return identity_map(request).get(ShipmentDraft, session_key=session_key, user=request.user)
+
+
+def start_draft(request, package_data):
+    # Starting over from the quote form replaces whatever was there
+    if request.session.session_key is None:
+        request.session.save()
+    draft, _ = ShipmentDraft.objects.update_or_create(
+        session_key=request.session.session_key,
+        defaults={'user': request.user, 'data': {'package': package_data}},
+    )
+    identity_map(request).add(draft, session_key=draft.session_key, user=request.user)
+    return draft
+
+
+def save_step(draft, step, data):
+    draft.data[step] = data
+    draft.save(update_fields=['data', 'updated_at'])
+
+
+def form_data(form):
+    # What the user submitted for the form's fields, re-validated at commit
+    return {name: form.data.get(name) for name in form.fields if name in form.data}
+
+
+def missing_step(draft, before):
+    # URL name of the first required step not done yet, or None
+    for step, url_name in STEPS:
+        if step == before:
+            return None
+        if step not in OPTIONAL_STEPS and (draft is None or step not in draft.data):
+            return url_name
+    return None
+
+
+def save_contact(request, data):
+    # Keeps the sender's address book entry in step with the checkout
+    values = {
+        'company': data['sender_company'],
+        'country': "",  # Add the sender's country
+        'address': data['sender_address'],
+        'address2': data['sender_address2'],
+        'address3': data['sender_address3'],
+        'zip_code': None,  # Add the sender's zip code
+        'city': data['sender_city'],
+        'state': data['sender_state'],
+        'email': data['sender_email'],
+        'phone_type': data['sender_phone_type'],
+        'phone_country_code': data['sender_phone_code'],
+        'phone_number': data['sender_phone_number'],
+    }
+    objects = identity_map(request)
+    contact = objects.get(Contact, user=request.user)
+    if contact is None or contact.name != data['sender_name']:
+        contact = objects.get(Contact, user=request.user, name=data['sender_name'])
+    if contact is None:
+        return Contact.objects.create(user=request.user, name=data['sender_name'], **values)
+    changed = assign(contact, values)
+    if changed:
+        contact.save(update_fields=changed)
+    return contact
+
+
+def commit_draft(request, draft, checkout_form, shipment_form, packaging_form, payment_values):
+    # Writes the whole shipment. The forms are the draft's steps re-bound
+    # and validated by the caller.
+    package_data = draft.data['package']
+    # Allocated before the transaction: a block reserved inside it could be
+    # rolled back while this process keeps handing out its numbers
+    package_id = new_package_id()
+    with transaction.atomic():
+        package = Package.objects.create(
+            sender=request.user,
+            package_id=package_id,
+            quote_id=package_data['quote_id'],
+            pickup_country=package_data['pickup_country'],
+            delivery_country=package_data['delivery_country'],
+            weight=package_data['weight'],
+            height=package_data['height'],
+            width=package_data['width'],
+            length=package_data['length'],
+        )
+
+        checkout = checkout_form.save(commit=False)
+        checkout.package = package
+        checkout.sender_pickup_country = package_data['pickup_country']
+        checkout.sender_pickup_zip = package_data['pickup_zip']
+        checkout.receiver_delivery_country = package_data['delivery_country']
+        checkout.receiver_delivery_zip = package_data['delivery_zip']
+        checkout.save()
+        save_contact(request, checkout_form.cleaned_data)
+
+        packaging = packaging_form.save()
+
+        payment = get_or_create_payment(payment_values)
+
+        shipment = shipment_form.save(commit=False)
+        shipment.package = package
+        shipment.contact_info = checkout
+        shipment.origin = checkout.sender_pickup_country
+        shipment.destination = checkout.receiver_delivery_country
+        shipment.weight = package.weight
+        shipment.packaging = packaging
+        shipment.payment = payment
+        shipment.image = draft.data.get('image')
+        shipment.status = ShipmentEvent.PENDING
+        shipment.save()
+        shipment.record_event(ShipmentEvent.PENDING)
+        shipment.record_event(ShipmentEvent.SUCCESSFUL)
+
+        draft.delete()
+    return shipment
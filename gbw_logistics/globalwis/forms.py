@@ -1,5 +1,6 @@
 from django import forms
 from .models import Package, Location, Checkout, Shipment, Packaging, Contact
+from .drafts import get_draft
 from django_countries.fields import CountryField
 from django_countries import countries
 
@@ -77,10 +78,9 @@ class CheckoutForm(forms.ModelForm):
 
     def clean(self):
         cleaned_data = super().clean()
-        package_id = self.request.session.get('package_id')
-        if package_id is not None:
-            package = Package.objects.get(package_id=package_id)
-            cleaned_data['package'] = package
+        # The wizard draft, loaded through the request's identity map so
+        # CheckoutView reuses it
+        cleaned_data['draft'] = get_draft(self.request)
 
         return cleaned_data
 
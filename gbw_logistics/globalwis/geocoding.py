@@ -0,0 +1,224 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from . import outbound
+from .models import GeocodeCache
+
+
+OPENCAGE_URL = "https://api.opencagedata.com/geocode/v1/json"
+
+
+class LRUCache:
+    # Small thread-safe LRU where every entry carries its own expiry time
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_memory = LRUCache(settings.GEOCODE_CACHE_SIZE, settings.GEOCODE_CACHE_TTL)
+
+_stats_lock = threading.Lock()
+_stats = {
+    'memory_hits': 0,
+    'db_hits': 0,
+    'negative_hits': 0,
+    'misses': 0,
+    'api_calls': 0,
+    'api_errors': 0,
+    'stale_served': 0,
+    'revalidations': 0,
+    'fallback_stale': 0,
+    'fallback_base_price': 0,
+}
+
+breaker = outbound.CircuitBreaker(
+    'opencage',
+    failure_threshold=settings.GEOCODE_BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=settings.GEOCODE_BREAKER_RESET_TIMEOUT,
+)
+
+# Background refreshes of stale entries, at most one per query at a time
+_revalidator = ThreadPoolExecutor(max_workers=2, thread_name_prefix='geocode-revalidate')
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['memory_entries'] = len(_memory)
+    stats['breaker'] = breaker.snapshot()
+    return stats
+
+
+def normalize_query(address):
+    return str(address).strip().lower()
+
+
+def _ttl_for(lat):
+    # "No results" answers are kept for a shorter time than real coordinates
+    if lat is None:
+        return settings.GEOCODE_NEGATIVE_CACHE_TTL
+    return settings.GEOCODE_CACHE_TTL
+
+
+def _parse(response):
+    # Coordinates, (None, None) for "no results", or None when OpenCage
+    # answered with an error (bad key, quota, timeout...) that mustn't be cached
+    if isinstance(response, Exception) or response.status_code != 200:
+        return None
+    try:
+        payload = response.json()
+    except ValueError:
+        return None
+    if not payload.get('total_results'):
+        return (None, None) if 'total_results' in payload else None
+    geometry = payload['results'][0]['geometry']
+    return geometry['lat'], geometry['lng']
+
+
+def _cached(key):
+    # Returns (state, coords) where state is 'fresh', 'stale' (past its TTL
+    # but still the last known answer) or None when we have nothing.
+
+    # 1. In-process LRU
+    found, coords = _memory.get(key)
+    if found:
+        _count('memory_hits')
+        if coords[0] is None:
+            _count('negative_hits')
+        return 'fresh', coords
+
+    # 2. Shared DB table
+    entry = GeocodeCache.objects.filter(query=key).first()
+    if entry is None:
+        return None, None
+    coords = (entry.lat, entry.lng)
+    age = (timezone.now() - entry.fetched_at).total_seconds()
+    ttl = _ttl_for(entry.lat)
+    if age >= ttl:
+        return 'stale', coords
+    _count('db_hits')
+    if entry.lat is None:
+        _count('negative_hits')
+    _memory.set(key, coords, ttl=ttl - age)
+    return 'fresh', coords
+
+
+def _store(key, response):
+    # Records the OpenCage answer with the breaker and caches it. Returns the
+    # coordinates, or None if the call failed.
+    _count('api_calls')
+    coords = _parse(response)
+    if coords is None:
+        _count('api_errors')
+        breaker.record_failure()
+        return None
+    breaker.record_success()
+    GeocodeCache.objects.update_or_create(
+        query=key,
+        defaults={'lat': coords[0], 'lng': coords[1], 'fetched_at': timezone.now()},
+    )
+    _memory.set(key, coords, ttl=_ttl_for(coords[0]))
+    return coords
+
+
+def _revalidate(key, address, api_key):
+    try:
+        response = outbound.get_many([(OPENCAGE_URL, {'params': {'q': address, 'key': api_key}})])[0]
+        _store(key, response)
+    finally:
+        with _revalidating_lock:
+            _revalidating.discard(key)
+        connections.close_all()
+
+
+def _schedule_revalidation(key, address, api_key):
+    with _revalidating_lock:
+        if key in _revalidating:
+            return
+        _revalidating.add(key)
+    _count('revalidations')
+    _revalidator.submit(_revalidate, key, address, api_key)
+
+
+def get_geocodes(addresses, api_key):
+    # Geocodes several addresses; cache misses are fetched from OpenCage
+    # concurrently. Stale entries are served at once and refreshed in the
+    # background. While the breaker is open nothing is sent to OpenCage:
+    # stale entries are used when we have them, otherwise (None, None)
+    # sends the quote down the base-price path.
+    results = {}
+    misses = {}
+    for address in addresses:
+        key = normalize_query(address)
+        if key in results or key in misses:
+            continue
+        state, coords = _cached(key)
+        if state == 'fresh':
+            results[key] = coords
+        elif state == 'stale':
+            results[key] = coords
+            if breaker.allow():
+                _count('stale_served')
+                _schedule_revalidation(key, address, api_key)
+            else:
+                _count('fallback_stale')
+        elif breaker.allow():
+            misses[key] = address
+        else:
+            _count('fallback_base_price')
+            results[key] = (None, None)
+
+    # 3. OpenCage
+    calls = [(OPENCAGE_URL, {'params': {'q': address, 'key': api_key}}) for address in misses.values()]
+    for key, response in zip(misses, outbound.get_many(calls)):
+        _count('misses')
+        coords = _store(key, response)
+        results[key] = (None, None) if coords is None else coords
+
+    return [results[normalize_query(address)] for address in addresses]
+
+
+def get_geocode(address, api_key):
+    return get_geocodes([address], api_key)[0]
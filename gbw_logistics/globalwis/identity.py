@@ -0,0 +1,39 @@
+# Request-scoped identity map: each row a request needs is loaded once and
+# the same instance is handed to every form and view method that asks for
+# it, so they all see each other's changes and nothing is fetched twice.
+
+_MISSING = object()
+
+
+class IdentityMap:
+    def __init__(self):
+        self._objects = {}
+
+    def get(self, model, **lookup):
+        # First row matching lookup, or None. Misses are remembered too.
+        key = (model._meta.label, tuple(sorted(lookup.items())))
+        instance = self._objects.get(key, _MISSING)
+        if instance is _MISSING:
+            instance = model._default_manager.filter(**lookup).order_by('pk').first()
+            self._objects[key] = instance
+        return instance
+
+    def add(self, instance, **lookup):
+        self._objects[(instance._meta.label, tuple(sorted(lookup.items())))] = instance
+
+
+def identity_map(request):
+    if not hasattr(request, '_identity_map'):
+        request._identity_map = IdentityMap()
+    return request._identity_map
+
+
+def assign(instance, values):
+    # Sets the given field values and returns the names of those that
+    # actually changed, ready for save(update_fields=...)
+    changed = []
+    for field, value in values.items():
+        if getattr(instance, field) != value:
+            setattr(instance, field, value)
+            changed.append(field)
+    return changed
@@ -0,0 +1,165 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.urls import reverse
+
+
+# Shipment photos are stored under their SHA-256, so the same photo uploaded
+# twice is kept once and a stored file never changes. Layout:
+#   IMAGE_STORE_ROOT/ab/cd/<digest>.<ext>           original
+#   IMAGE_STORE_ROOT/ab/cd/<digest>.<variant>.webp  resized copies
+# Shipment.image holds "<digest>.<ext>". Older rows hold a /static/ URL.
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {'JPEG': 'jpeg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+CONTENT_TYPES = {'jpeg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif', 'webp': 'image/webp'}
+NAME_RE = re.compile(r'^(?P<digest>[0-9a-f]{64})\.(?:(?P<variant>[a-z]+)\.webp|(?P<ext>jpeg|png|gif|webp))$')
+
+
+def directory_for(digest):
+    return os.path.join(settings.IMAGE_STORE_ROOT, digest[:2], digest[2:4])
+
+
+def path_for(name):
+    return os.path.join(directory_for(name[:64]), name)
+
+
+def store_upload(upload):
+    # Streams an uploaded image (already validated by forms.ImageField) into
+    # the store and returns its name. The file is hashed while it is copied
+    # to a temp file next to its final place, then renamed into position.
+    ext = FORMATS.get(getattr(upload.image, 'format', None))
+    if ext is None:
+        raise ValueError('Unsupported image format')
+    os.makedirs(settings.IMAGE_STORE_ROOT, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=settings.IMAGE_STORE_ROOT, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            for chunk in upload.chunks():
+                digest.update(chunk)
+                tmp.write(chunk)
+        name = f'{digest.hexdigest()}.{ext}'
+        path = path_for(name)
+        if os.path.exists(path):
+            os.remove(tmp_path)  # already stored
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return name
+
+
+def variant_name(name, variant):
+    return f'{name[:64]}.{variant}.webp'
+
+
+def make_variants(path, variants):
+    # Runs in a worker process. variants maps a name to the longest side
+    # in pixels; existing variants are left alone.
+    from PIL import Image
+
+    digest_path = path.rsplit('.', 1)[0]
+    made = []
+    for variant, size in variants.items():
+        target = f'{digest_path}.{variant}.webp'
+        if os.path.exists(target):
+            continue
+        with Image.open(path) as image:
+            image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+            image.thumbnail((size, size))
+            tmp_path = f'{target}.tmp'
+            image.save(tmp_path, 'WEBP', quality=80)
+        os.replace(tmp_path, target)
+        made.append(variant)
+    return made
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(broken=None):
+    # Spawned rather than forked: the web process has threads and DB
+    # connections. Passing the pool that just failed replaces it, unless
+    # another thread has done so already.
+    global _executor
+    if _executor is None or _executor is broken:
+        with _executor_lock:
+            if _executor is None or _executor is broken:
+                if broken is not None:
+                    broken.shutdown(wait=False)
+                _executor = ProcessPoolExecutor(
+                    max_workers=settings.IMAGE_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+    return _executor
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        logger.error('Image variants failed: %s', future.exception())
+
+
+def schedule_variants(name):
+    # Returns straight away, the resizing happens in the worker pool. A
+    # worker that died (out of memory on a huge image, say) breaks the whole
+    # pool, so it is rebuilt once. Never raises: without variants the
+    # original is served in their place.
+    executor = get_executor()
+    try:
+        try:
+            future = executor.submit(make_variants, path_for(name), settings.IMAGE_VARIANTS)
+        except BrokenProcessPool:
+            future = get_executor(broken=executor).submit(make_variants, path_for(name), settings.IMAGE_VARIANTS)
+    except Exception:
+        logger.exception('Could not schedule image variants for %s', name)
+        return None
+    future.add_done_callback(_log_failure)
+    return future
+
+
+def image_urls(name):
+    # URLs for the original and each variant; legacy values are used as is
+    if not name:
+        return {}
+    if NAME_RE.match(name) is None:
+        return dict.fromkeys(['original', *settings.IMAGE_VARIANTS], name)
+    urls = {'original': reverse('shipment_image', args=[name])}
+    for variant in settings.IMAGE_VARIANTS:
+        urls[variant] = reverse('shipment_image', args=[variant_name(name, variant)])
+    return urls
+
+
+def resolve(name):
+    # (path, content_type, final) for a requested name, or None. A variant
+    # that isn't generated yet resolves to the original, with final False
+    # so it isn't cached for good.
+    match = NAME_RE.match(name)
+    if match is None:
+        return None
+    if match['variant'] is None:
+        path = path_for(name)
+        return (path, CONTENT_TYPES[match['ext']], True) if os.path.exists(path) else None
+    if match['variant'] not in settings.IMAGE_VARIANTS:
+        return None
+    path = path_for(name)
+    if os.path.exists(path):
+        return path, 'image/webp', True
+    for ext in CONTENT_TYPES:
+        original = path_for(f"{match['digest']}.{ext}")
+        if os.path.exists(original):
+            return original, CONTENT_TYPES[ext], False
+    return None
@@ -0,0 +1,37 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from globalwis.postcodes import PostcodeIndex
+
+
+class Command(BaseCommand):
+    help = 'Time lookups against the postal code index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--index', default=settings.POSTCODE_INDEX_PATH)
+        parser.add_argument('--lookups', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        try:
+            index = PostcodeIndex(options['index'])
+        except FileNotFoundError:
+            raise CommandError('No postcode index, run build_postcode_index first')
+        if not len(index):
+            raise CommandError('The postcode index is empty')
+
+        # Half hits taken from the index itself, half misses
+        keys = [index.key_at(random.randrange(len(index))).rstrip(b'\0').decode() for _ in range(options['lookups'] // 2)]
+        queries = [(key[:2], key[2:]) for key in keys] + [('ZZ', str(n)) for n in range(options['lookups'] - len(keys))]
+        random.shuffle(queries)
+
+        start = time.perf_counter()
+        found = sum(1 for country, postcode in queries if index.lookup(country, postcode) is not None)
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(f'{len(index)} postcodes indexed')
+        self.stdout.write(f'{len(queries)} lookups ({found} hits) in {elapsed:.3f}s')
+        self.stdout.write(f'{elapsed / len(queries) * 1e6:.2f} µs per lookup')
+        index.close()
@@ -0,0 +1,83 @@
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template import Context, Template
+
+from globalwis.models import Checkout, Package, Shipment, Stations
+from globalwis.projections import ShipmentListRow, project
+
+
+# The manage shipments row, written against model instances and against rows
+INSTANCE_TEMPLATE = Template(
+    '{% for s in shipments %}{{ s.package.package_id }}{{ s.contact_info.sender_company }}{{ s.contact_info.sender_name }}'
+    '{{ s.contact_info.sender_state }}{{ s.origin }}{{ s.contact_info.receiver_company }}{{ s.contact_info.receiver_name }}'
+    '{{ s.contact_info.receiver_state }}{{ s.destination }}{{ s.drop_off_location.name }}{{ s.drop_off_location.address }}'
+    '{{ s.drop_off_location.state }}{{ s.pick_up_location.name }}{{ s.pick_up_location.address }}{{ s.pick_up_location.state }}'
+    '{{ s.weight }}{{ s.description }}{{ s.status }}{{ s.contact_info.sender_email }}{% endfor %}'
+)
+ROW_TEMPLATE = Template(
+    '{% for s in shipments %}{{ s.package_id }}{{ s.sender_company }}{{ s.sender_name }}'
+    '{{ s.sender_state }}{{ s.origin }}{{ s.receiver_company }}{{ s.receiver_name }}'
+    '{{ s.receiver_state }}{{ s.destination }}{{ s.drop_off_name }}{{ s.drop_off_address }}'
+    '{{ s.drop_off_state }}{{ s.pick_up_name }}{{ s.pick_up_address }}{{ s.pick_up_state }}'
+    '{{ s.weight }}{{ s.description }}{{ s.status }}{{ s.sender_email }}{% endfor %}'
+)
+
+
+class Command(BaseCommand):
+    help = 'Compare memory and render time of full instances against projected rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        # Everything is created inside a transaction that is rolled back
+        with transaction.atomic():
+            queryset = self.make_shipments(options['rows'])
+            loaders = [
+                ('instances', lambda: list(queryset.select_related('package', 'contact_info', 'drop_off_location', 'pick_up_location')), INSTANCE_TEMPLATE),
+                ('rows', lambda: list(project(queryset, ShipmentListRow)), ROW_TEMPLATE),
+            ]
+            for name, load, template in loaders:
+                self.measure(name, load, template, options['rows'])
+            transaction.set_rollback(True)
+
+    def make_shipments(self, count):
+        user = User.objects.create(username='bench-projections')
+        station = Stations.objects.create(name='Bench station', address='1 Bench Road', state='Bench')
+        packages = Package.objects.bulk_create(
+            Package(sender=user, package_id=f'BENCH{n}', pickup_country='US', delivery_country='GB', weight=1, height=10, width=10, length=10)
+            for n in range(count)
+        )
+        checkouts = Checkout.objects.bulk_create(
+            Checkout(package=package, sender_name='Sender', sender_address='1 Main St', sender_email='sender@example.com',
+                     receiver_name='Receiver', receiver_state='London')
+            for package in packages
+        )
+        Shipment.objects.bulk_create(
+            Shipment(package=package, contact_info=checkout, status='Pending', origin='US', destination='GB',
+                     drop_off_location=station, pick_up_location=station)
+            for package, checkout in zip(packages, checkouts)
+        )
+        return Shipment.objects.filter(package__sender=user).order_by('-date', '-id')
+
+    def measure(self, name, load, template, count):
+        tracemalloc.start()
+        start = time.perf_counter()
+        shipments = load()
+        load_time = time.perf_counter() - start
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        template.render(Context({'shipments': shipments}))
+        render_time = time.perf_counter() - start
+
+        per_10k = 10000 / count
+        self.stdout.write(
+            f'{name:>9}: {memory * per_10k / 2**20:.1f} MiB per 10k rows, '
+            f'load {load_time * per_10k:.3f}s, render {render_time * per_10k:.3f}s per 10k rows'
+        )
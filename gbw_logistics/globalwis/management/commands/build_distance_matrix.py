@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from geopy import distance
+
+from globalwis.distances import CENTROIDS_PATH, load_centroids
+from globalwis.models import LocationDistance
+
+
+class Command(BaseCommand):
+    help = 'Fill LocationDistance with the distance between every pair of countries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--centroids', default=CENTROIDS_PATH, help='CSV file with code,name,lat,lng columns')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        centroids = load_centroids(options['centroids'])
+        batch_size = options['batch_size']
+        batch = []
+        written = 0
+
+        with transaction.atomic():
+            for pickup, pickup_point in centroids.items():
+                for delivery, delivery_point in centroids.items():
+                    batch.append(LocationDistance(
+                        pickup_country=pickup,
+                        delivery_country=delivery,
+                        distance_km=distance.distance(pickup_point, delivery_point).km,
+                    ))
+                    if len(batch) >= batch_size:
+                        written += self._write(batch)
+                        batch = []
+            if batch:
+                written += self._write(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written} distances for {len(centroids)} countries. '
+            'Restart the web workers to pick up the new matrix.'
+        ))
+
+    def _write(self, batch):
+        LocationDistance.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=['pickup_country', 'delivery_country'],
+            update_fields=['distance_km'],
+        )
+        return len(batch)
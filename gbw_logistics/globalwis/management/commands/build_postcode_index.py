@@ -0,0 +1,39 @@
+import csv
+import io
+import zipfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from globalwis.postcodes import build_index
+
+
+def read_geonames(path):
+    # GeoNames postal code dump: tab separated, country code in column 0,
+    # postal code in column 1, latitude/longitude in columns 9 and 10
+    if str(path).endswith('.zip'):
+        archive = zipfile.ZipFile(path)
+        names = [name for name in archive.namelist() if name.endswith('.txt') and not name.lower().startswith('readme')]
+        streams = [io.TextIOWrapper(archive.open(name), encoding='utf-8') for name in names]
+    else:
+        streams = [open(path, encoding='utf-8')]
+
+    for stream in streams:
+        with stream:
+            for row in csv.reader(stream, delimiter='\t', quoting=csv.QUOTE_NONE):
+                if len(row) < 11 or not row[9] or not row[10]:
+                    continue
+                yield row[0], row[1], float(row[9]), float(row[10])
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the offline postal code index from GeoNames postal code dumps'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dumps', nargs='+', help='GeoNames .txt or .zip files (e.g. allCountries.zip)')
+        parser.add_argument('--output', default=settings.POSTCODE_INDEX_PATH)
+
+    def handle(self, *args, **options):
+        rows = (row for path in options['dumps'] for row in read_geonames(path))
+        count = build_index(rows, options['output'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} postcodes into {options['output']}"))
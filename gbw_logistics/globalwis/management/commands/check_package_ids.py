@@ -0,0 +1,65 @@
+import multiprocessing
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+def setup_worker(database_name=None):
+    # Spawned workers start fresh and set Django up themselves, sharing only
+    # the database. The tests point them at the test database.
+    if database_name:
+        settings.DATABASES['default']['NAME'] = database_name
+    django.setup()
+
+
+def allocate_ids(count, block_size):
+    from globalwis.package_ids import Allocator, is_valid
+
+    allocator = Allocator(block_size)
+    ids = [allocator.allocate() for _ in range(count)]
+    bad = sum(1 for package_id in ids if not is_valid(package_id))
+    connections.close_all()
+    return ids, bad
+
+
+def allocate_in_processes(processes, per_process, block_size, database_name=None):
+    # Returns one (ids, invalid count) pair per process
+    connections.close_all()
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(processes, initializer=setup_worker, initargs=(database_name,)) as pool:
+        return pool.starmap(allocate_ids, [(per_process, block_size)] * processes)
+
+
+class Command(BaseCommand):
+    help = 'Allocate package IDs from several processes at once and check none repeats (uses up sequence numbers)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8)
+        parser.add_argument('--ids', type=int, default=1000000, help='Total IDs to allocate')
+        parser.add_argument('--block-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        per_process = options['ids'] // processes
+        start = time.perf_counter()
+        results = allocate_in_processes(processes, per_process, options['block_size'])
+        elapsed = time.perf_counter() - start
+
+        seen = set()
+        duplicates = 0
+        invalid = 0
+        for ids, bad in results:
+            invalid += bad
+            for package_id in ids:
+                if package_id in seen:
+                    duplicates += 1
+                seen.add(package_id)
+
+        total = per_process * processes
+        self.stdout.write(f'{total} IDs from {processes} processes in {elapsed:.1f}s, e.g. {results[0][0][0]}')
+        if duplicates or invalid:
+            raise CommandError(f'{duplicates} duplicate and {invalid} invalid IDs')
+        self.stdout.write(self.style.SUCCESS('No duplicates'))
@@ -0,0 +1,57 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from globalwis.models import Package, ShipmentDraft
+
+
+class Command(BaseCommand):
+    help = 'Delete packages that never got a package_id and abandoned shipment drafts, in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=settings.UNASSIGNED_PACKAGE_GRACE,
+                            help='Only delete packages older than this many seconds')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--max-batches', type=int, default=None, help='Stop after this many batches')
+        parser.add_argument('--pause', type=float, default=0.1, help='Seconds to sleep between batches')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(seconds=options['grace'])
+        abandoned = Package.objects.filter(package_id=None, created_at__lt=cutoff)
+        if options['dry_run']:
+            self.stdout.write(f'{abandoned.count()} unassigned packages older than {cutoff:%Y-%m-%d %H:%M}')
+            self.stdout.write(f'{ShipmentDraft.objects.filter(updated_at__lt=cutoff).count()} shipment drafts older than that')
+            return
+
+        total = 0
+        batch = 0
+        while options['max_batches'] is None or batch < options['max_batches']:
+            # Each batch is its own short transaction; the package_id check is
+            # repeated so a package assigned since it was selected is kept
+            with transaction.atomic():
+                pks = list(abandoned.order_by('pk').values_list('pk', flat=True)[:options['batch_size']])
+                if not pks:
+                    break
+                deleted, by_model = Package.objects.filter(pk__in=pks, package_id=None).delete()
+            batch += 1
+            packages = by_model.get(Package._meta.label, 0)
+            total += packages
+            self.stdout.write(f'Batch {batch}: {packages} packages deleted ({deleted} rows including related)')
+            time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(f'{total} unassigned packages deleted in {batch} batches'))
+
+        # Wizard drafts nobody came back to
+        drafts = 0
+        stale = ShipmentDraft.objects.filter(updated_at__lt=cutoff).order_by('pk').values_list('pk', flat=True)
+        while True:
+            pks = list(stale[:options['batch_size']])
+            if not pks:
+                break
+            drafts += ShipmentDraft.objects.filter(pk__in=pks).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f'{drafts} abandoned shipment drafts deleted'))
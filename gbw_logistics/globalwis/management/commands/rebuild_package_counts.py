@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from globalwis.stats import rebuild_location_counts
+
+
+class Command(BaseCommand):
+    help = 'Recompute the package counts per origin country and drop-off station'
+
+    def handle(self, *args, **options):
+        rows = rebuild_location_counts()
+        self.stdout.write(f'Rebuilt {rows} package count rows')
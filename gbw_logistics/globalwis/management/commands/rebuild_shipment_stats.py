@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from globalwis.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-user dashboard stats from packages and shipments'
+
+    def handle(self, *args, **options):
+        users = rebuild_stats()
+        self.stdout.write(f'Rebuilt shipment stats for {users} users')
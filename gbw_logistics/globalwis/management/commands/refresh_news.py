@@ -0,0 +1,35 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from globalwis.news import refresh_news
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Fetch the news feed from NewsAPI into the NewsArticle table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep refreshing every NEWS_REFRESH_INTERVAL seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            try:
+                stored, pruned = refresh_news()
+            except Exception:
+                # One bad refresh mustn't stop the background loop, the
+                # next one gets a fresh connection and a fresh fetch
+                if not options['loop']:
+                    raise
+                logger.exception('News refresh failed')
+            else:
+                self.stdout.write(f'Stored {stored} articles, pruned {pruned}')
+            if not options['loop']:
+                break
+            time.sleep(settings.NEWS_REFRESH_INTERVAL)
@@ -0,0 +1,31 @@
+# Generated by Django 4.2 on 2026-10-18 08:46
+
+from django.db import migrations, models
+
+
+def remove_duplicate_pairs(apps, schema_editor):
+    # Keep the most recent row for each country pair
+    LocationDistance = apps.get_model('globalwis', 'LocationDistance')
+    seen = set()
+    duplicates = []
+    for pk, pickup, delivery in LocationDistance.objects.order_by('-pk').values_list('pk', 'pickup_country', 'delivery_country'):
+        if (pickup, delivery) in seen:
+            duplicates.append(pk)
+        else:
+            seen.add((pickup, delivery))
+    LocationDistance.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('globalwis', '0003_geocodecache'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_pairs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='locationdistance',
+            constraint=models.UniqueConstraint(fields=('pickup_country', 'delivery_country'), name='unique_country_pair'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2 on 2026-10-18 08:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('globalwis', '0004_locationdistance_unique_country_pair'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Quote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pickup_country', models.CharField(max_length=2)),
+                ('pickup_zip', models.CharField(blank=True, max_length=20)),
+                ('delivery_country', models.CharField(max_length=2)),
+                ('delivery_zip', models.CharField(blank=True, max_length=20)),
+                ('weight', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('length', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('width', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('height', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('distance_km', models.FloatField(null=True)),
+                ('speed_time', models.FloatField(null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expires_at', models.DateTimeField()),
+                ('sender', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='quote',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='globalwis.quote'),
+        ),
+    ]
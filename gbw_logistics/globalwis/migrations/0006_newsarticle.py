@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-18 08:53
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('globalwis', '0005_quote'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewsArticle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=1000, unique=True)),
+                ('title', models.CharField(max_length=500)),
+                ('description', models.TextField(blank=True)),
+                ('source', models.CharField(blank=True, max_length=255)),
+                ('author', models.CharField(blank=True, max_length=255)),
+                ('image_url', models.URLField(blank=True, max_length=1000)),
+                ('published_at', models.DateTimeField(db_index=True, null=True)),
+                ('fetched_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2 on 2026-10-18 08:53
+
+import uuid
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def deduplicate_package_ids(apps, schema_editor):
+    Package = apps.get_model('globalwis', 'Package')
+
+    # Blank IDs are treated like unassigned ones
+    Package.objects.filter(package_id='').update(package_id=None)
+
+    # The oldest package keeps a duplicated ID, later ones get a fresh one
+    duplicated = (
+        Package.objects.exclude(package_id=None)
+        .values('package_id')
+        .annotate(n=Count('id'))
+        .filter(n__gt=1)
+        .values_list('package_id', flat=True)
+    )
+    for package_id in list(duplicated):
+        for package in Package.objects.filter(package_id=package_id).order_by('pk')[1:]:
+            new_id = 'gbw' + uuid.uuid4().hex[:8]
+            while Package.objects.filter(package_id=new_id).exists():
+                new_id = 'gbw' + uuid.uuid4().hex[:8]
+            package.package_id = new_id
+            package.save(update_fields=['package_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('globalwis', '0006_newsarticle'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate_package_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='package',
+            name='package_id',
+            field=models.CharField(max_length=255, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2 on 2026-10-18 08:55
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('globalwis', '0007_package_package_id_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shipment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2 on 2026-10-18 08:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def seed_events(apps, schema_editor):
+    # Start every existing shipment's history with its current status
+    Shipment = apps.get_model('globalwis', 'Shipment')
+    ShipmentEvent = apps.get_model('globalwis', 'ShipmentEvent')
+    for shipment in Shipment.objects.filter(latest_event=None).iterator():
+        event = ShipmentEvent.objects.create(
+            shipment=shipment,
+            status=(shipment.status or 'Pending')[:32],
+            state=shipment.current_state,
+            country=shipment.current_country,
+            zip_code=shipment.current_zip,
+            timestamp=shipment.date,
+        )
+        Shipment.objects.filter(pk=shipment.pk).update(latest_event=event)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('globalwis', '0008_shipment_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShipmentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Successful', 'Paid'), ('In Transit', 'In Transit'), ('Delivered', 'Delivered'), ('Canceled', 'Canceled')], max_length=32)),
+                ('state', models.CharField(blank=True, max_length=255, null=True)),
+                ('country', models.CharField(blank=True, max_length=255, null=True)),
+                ('zip_code', models.CharField(blank=True, max_length=255, null=True)),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('shipment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='globalwis.shipment')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='latest_event',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='globalwis.shipmentevent'),
+        ),
+        migrations.AddIndex(
+            model_name='shipmentevent',
+            index=models.Index(fields=['shipment', 'timestamp'], name='shipment_event_timeline'),
+        ),
+        migrations.RunPython(seed_events, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 08:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('globalwis', '0009_shipmentevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['-date', '-id'], name='shipment_date_id'),
+        ),
+    ]
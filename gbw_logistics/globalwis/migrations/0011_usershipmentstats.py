@@ -0,0 +1,76 @@
+# Generated by Django 4.2 on 2026-10-18 09:01
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+import django.db.models.deletion
+
+
+STATUS_COLUMNS = {
+    'Pending': 'pending',
+    'Successful': 'paid',
+    'In Transit': 'in_transit',
+    'Delivered': 'delivered',
+    'Canceled': 'canceled',
+}
+
+
+def fill_stats(apps, schema_editor):
+    Package = apps.get_model('globalwis', 'Package')
+    Shipment = apps.get_model('globalwis', 'Shipment')
+    UserShipmentStats = apps.get_model('globalwis', 'UserShipmentStats')
+    stats = {}
+
+    def row(user_id):
+        if user_id not in stats:
+            stats[user_id] = UserShipmentStats(user_id=user_id)
+        return stats[user_id]
+
+    for item in Package.objects.values('sender_id').annotate(n=Count('id'), weight=Sum('weight')).order_by():
+        entry = row(item['sender_id'])
+        entry.packages = item['n']
+        entry.total_weight = item['weight'] or 0
+
+    shipments = Shipment.objects.filter(package__isnull=False).values('package__sender_id', 'status')
+    for item in shipments.annotate(n=Count('id'), last=Max('date')).order_by():
+        entry = row(item['package__sender_id'])
+        column = STATUS_COLUMNS.get(item['status'], 'other_status')
+        setattr(entry, column, getattr(entry, column) + item['n'])
+        entry.shipments += item['n']
+        if entry.last_shipment_at is None or item['last'] > entry.last_shipment_at:
+            entry.last_shipment_at = item['last']
+
+    paid = Shipment.objects.filter(package__isnull=False, payment__isnull=False).values('package__sender_id')
+    for item in paid.annotate(spend=Sum('package__quote__price')).order_by():
+        row(item['package__sender_id']).total_spend = item['spend'] or 0
+
+    UserShipmentStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('globalwis', '0010_shipment_date_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserShipmentStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='shipment_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('packages', models.PositiveIntegerField(default=0)),
+                ('shipments', models.PositiveIntegerField(default=0)),
+                ('pending', models.PositiveIntegerField(default=0)),
+                ('paid', models.PositiveIntegerField(default=0)),
+                ('in_transit', models.PositiveIntegerField(default=0)),
+                ('delivered', models.PositiveIntegerField(default=0)),
+                ('canceled', models.PositiveIntegerField(default=0)),
+                ('other_status', models.PositiveIntegerField(default=0)),
+                ('total_weight', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_spend', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('last_shipment_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
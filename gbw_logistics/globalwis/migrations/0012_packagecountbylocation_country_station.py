@@ -0,0 +1,74 @@
+# Generated by Django 4.2 on 2026-10-18 09:02
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def clear_counts(apps, schema_editor):
+    # The old per-Location rows were never maintained
+    apps.get_model('globalwis', 'PackageCountByLocation').objects.all().delete()
+
+
+def fill_counts(apps, schema_editor):
+    Shipment = apps.get_model('globalwis', 'Shipment')
+    PackageCountByLocation = apps.get_model('globalwis', 'PackageCountByLocation')
+    countries = {}
+    stations = {}
+    groups = (
+        Shipment.objects.exclude(status='Canceled')
+        .values_list('origin', 'drop_off_location_id')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    for origin, station_id, n in groups:
+        if origin not in (None, '', 'False'):
+            countries[origin] = countries.get(origin, 0) + n
+        if station_id is not None:
+            stations[station_id] = stations.get(station_id, 0) + n
+    rows = [PackageCountByLocation(country=country, count=n) for country, n in countries.items()]
+    rows += [PackageCountByLocation(station_id=station_id, count=n) for station_id, n in stations.items()]
+    PackageCountByLocation.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('globalwis', '0011_usershipmentstats'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_counts, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='packagecountbylocation',
+            name='location',
+        ),
+        migrations.AddField(
+            model_name='packagecountbylocation',
+            name='country',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='packagecountbylocation',
+            name='station',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='globalwis.stations'),
+        ),
+        migrations.AlterField(
+            model_name='packagecountbylocation',
+            name='count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name='packagecountbylocation',
+            constraint=models.UniqueConstraint(fields=('country',), name='package_count_unique_country'),
+        ),
+        migrations.AddConstraint(
+            model_name='packagecountbylocation',
+            constraint=models.UniqueConstraint(fields=('station',), name='package_count_unique_station'),
+        ),
+        migrations.AddConstraint(
+            model_name='packagecountbylocation',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('country', None), ('station__isnull', False)), models.Q(('country__isnull', False), ('station', None)), _connector='OR'), name='package_count_country_or_station'),
+        ),
+        migrations.RunPython(fill_counts, migrations.RunPython.noop),
+    ]
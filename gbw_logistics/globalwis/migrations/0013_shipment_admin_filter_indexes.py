@@ -0,0 +1,31 @@
+# Generated by Django 4.2 on 2026-10-18 09:03
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('globalwis', '0012_packagecountbylocation_country_station'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='package',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['status'], name='shipment_status'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['origin'], name='shipment_origin'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['destination'], name='shipment_destination'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-18 09:06
+
+from django.db import migrations, models
+
+
+def create_sequence(apps, schema_editor):
+    apps.get_model('globalwis', 'PackageIdSequence').objects.create(name='package_id', next_value=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('globalwis', '0013_shipment_admin_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PackageIdSequence',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('next_value', models.PositiveBigIntegerField(default=1)),
+            ],
+        ),
+        migrations.RunPython(create_sequence, migrations.RunPython.noop),
+    ]
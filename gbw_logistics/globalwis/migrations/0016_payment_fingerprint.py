@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('globalwis', '0015_shipmentdraft'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='fingerprint',
+            field=models.CharField(max_length=64, null=True),
+        ),
+    ]
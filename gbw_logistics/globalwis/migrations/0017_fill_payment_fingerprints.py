@@ -0,0 +1,48 @@
+# Generated by Django 4.2 on 2026-10-18 09:30
+
+import hashlib
+import hmac
+
+from django.conf import settings
+from django.db import migrations
+
+
+def card_fingerprint(card_number, expiry_month, expiry_year, cardholder_name):
+    # Copy of globalwis.payments.card_fingerprint as it was when this ran
+    number = ''.join(c for c in str(card_number) if c.isdigit())
+    name = ' '.join(str(cardholder_name).split()).casefold()
+    message = f'{number}|{int(expiry_month):02d}|{int(expiry_year)}|{name}'
+    key = settings.PAYMENT_FINGERPRINT_KEY.encode()
+    return hmac.new(key, message.encode(), hashlib.sha256).hexdigest()
+
+
+def fill_fingerprints(apps, schema_editor):
+    # Payments for the same card are merged into the oldest one and their
+    # shipments moved over before the column becomes unique
+    Payment = apps.get_model('globalwis', 'Payment')
+    Shipment = apps.get_model('globalwis', 'Shipment')
+    kept = {}
+    for payment in Payment.objects.order_by('pk').iterator():
+        fingerprint = card_fingerprint(
+            payment.card_number,
+            payment.card_expiry_month,
+            payment.card_expiry_year,
+            payment.cardholder_name,
+        )
+        if fingerprint in kept:
+            Shipment.objects.filter(payment_id=payment.pk).update(payment_id=kept[fingerprint])
+            payment.delete()
+        else:
+            kept[fingerprint] = payment.pk
+            Payment.objects.filter(pk=payment.pk).update(fingerprint=fingerprint)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('globalwis', '0016_payment_fingerprint'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_fingerprints, migrations.RunPython.noop),
+    ]
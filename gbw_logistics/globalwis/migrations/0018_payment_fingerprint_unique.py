@@ -0,0 +1,22 @@
+# Generated by Django 4.2 on 2026-10-18 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('globalwis', '0017_fill_payment_fingerprints'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payment',
+            name='fingerprint',
+            field=models.CharField(max_length=64, unique=True),
+        ),
+        migrations.RemoveField(
+            model_name='payment',
+            name='card_cvv',
+        ),
+    ]
@@ -1,12 +1,13 @@
-from django.db import models
+from django.db import models, transaction
 import requests
 from django.contrib.auth.models import User
 from django.urls import reverse
-from django.contrib.auth.mixins import LoginRequiredMixin
-from django.views.generic import ListView
 from django_countries.fields import CountryField
+from django_countries import countries
 from django.utils import timezone
 
+from .images import image_urls
+
 
 
 
@@ -29,6 +30,54 @@ class LocationDistance(models.Model):
     delivery_country = models.CharField(max_length=100)
     distance_km = models.FloatField()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['pickup_country', 'delivery_country'], name='unique_country_pair'),
+        ]
+
+
+class GeocodeCache(models.Model):
+    # lat/lng are left empty when OpenCage had no result for the query
+    query = models.CharField(max_length=255, unique=True)
+    lat = models.FloatField(null=True)
+    lng = models.FloatField(null=True)
+    fetched_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.query
+
+
+class Quote(models.Model):
+    sender = models.ForeignKey(User, on_delete=models.CASCADE)
+    pickup_country = models.CharField(max_length=2)
+    pickup_zip = models.CharField(max_length=20, blank=True)
+    delivery_country = models.CharField(max_length=2)
+    delivery_zip = models.CharField(max_length=20, blank=True)
+    weight = models.DecimalField(max_digits=5, decimal_places=2)
+    length = models.DecimalField(max_digits=5, decimal_places=2)
+    width = models.DecimalField(max_digits=5, decimal_places=2)
+    height = models.DecimalField(max_digits=5, decimal_places=2)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    distance_km = models.FloatField(null=True)
+    speed_time = models.FloatField(null=True)  # hours
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Quote #{self.pk}: {self.pickup_country} to {self.delivery_country}"
+
+    @property
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+
+    @property
+    def pickup_country_name(self):
+        return countries.name(self.pickup_country)
+
+    @property
+    def delivery_country_name(self):
+        return countries.name(self.delivery_country)
+
 
 class Package(models.Model):
     sender = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -38,12 +87,29 @@ class Package(models.Model):
     height = models.DecimalField(max_digits=5, decimal_places=2, default=False)
     width = models.DecimalField(max_digits=5, decimal_places=2, default=False)
     length = models.DecimalField(max_digits=5, decimal_places=2, default=False)
-    package_id = models.CharField(max_length=255, null=True)
-    created_at = models.DateTimeField(default=timezone.now)
+    package_id = models.CharField(max_length=255, null=True, unique=True)
+    quote = models.ForeignKey(Quote, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
 
     def __str__(self):
         return self.package_id
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Weight as loaded, so the stats signal handlers can see what a save changed
+        instance._loaded_weight = instance.__dict__.get('weight')
+        return instance
+
+class PackageIdSequence(models.Model):
+    # Counter that package_ids.reserve_block hands out in blocks
+    name = models.CharField(max_length=50, primary_key=True)
+    next_value = models.PositiveBigIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.name}: {self.next_value}"
+
+
 class Checkout(models.Model):
     package = models.ForeignKey(Package, on_delete=models.CASCADE, null=True)
     sender_name = models.CharField(max_length=100, null=True)
@@ -95,7 +161,8 @@ class Payment(models.Model):
     card_brand = models.CharField(max_length=20)
     card_expiry_month = models.IntegerField()
     card_expiry_year = models.IntegerField()
-    card_cvv = models.IntegerField()
+    # HMAC of the card identity, see globalwis/payments.py
+    fingerprint = models.CharField(max_length=64, unique=True)
 
     def __str__(self):
         return f"{self.cardholder_name}'s Card Details"
@@ -122,6 +189,7 @@ class Shipment(models.Model):
     origin = models.CharField(max_length=255, default=False, null=True)
     destination = models.CharField(max_length=255, default=False, null=True)
     date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     shipping_type = models.CharField(max_length=10, choices=[('documents', 'Documents'), ('packages', 'Packages')], blank=True)
     description = models.CharField(max_length=255, blank=True, null=True)
     contact_info = models.ForeignKey(Checkout, on_delete=models.CASCADE, null=True)
@@ -143,10 +211,89 @@ class Shipment(models.Model):
     current_state = models.CharField(max_length=255, blank=True, null=True)
     current_country = models.CharField(max_length=255, blank=True, null=True)
     current_zip = models.CharField(max_length=255, blank=True, null=True)
+    # Denormalized pointer to the newest ShipmentEvent, kept by record_event
+    latest_event = models.ForeignKey('ShipmentEvent', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-date', '-id'], name='shipment_date_id'),
+            # Admin list filters
+            models.Index(fields=['status'], name='shipment_status'),
+            models.Index(fields=['origin'], name='shipment_origin'),
+            models.Index(fields=['destination'], name='shipment_destination'),
+        ]
 
     def __str__(self):
         return f"{self.package.sender}'s Shipment"
 
+    # Columns the aggregate signal handlers compare against on save
+    TRACKED_FIELDS = ('status', 'payment_id', 'origin', 'drop_off_location_id')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_loaded()
+        return instance
+
+    def remember_loaded(self):
+        self._loaded = {field: self.__dict__.get(field) for field in self.TRACKED_FIELDS}
+
+    @property
+    def image_urls(self):
+        # original/thumb/large URLs of the content-addressed photo
+        return image_urls(self.image.name)
+
+    def record_event(self, status, state=None, country=None, zip_code=None):
+        # Appends to the event log and updates the current status/location
+        # columns in the same transaction. The shipment must be saved already.
+        # A location argument left as None keeps the current value; pass ''
+        # to clear it.
+        with transaction.atomic():
+            event = ShipmentEvent.objects.create(
+                shipment=self,
+                status=status,
+                state=state if state is not None else self.current_state,
+                country=country if country is not None else self.current_country,
+                zip_code=zip_code if zip_code is not None else self.current_zip,
+            )
+            self.latest_event = event
+            self.status = event.status
+            self.current_state = event.state
+            self.current_country = event.country
+            self.current_zip = event.zip_code
+            self.save(update_fields=['latest_event', 'status', 'current_state', 'current_country', 'current_zip', 'updated_at'])
+        return event
+
+
+class ShipmentEvent(models.Model):
+    PENDING = 'Pending'
+    SUCCESSFUL = 'Successful'
+    IN_TRANSIT = 'In Transit'
+    DELIVERED = 'Delivered'
+    CANCELED = 'Canceled'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SUCCESSFUL, 'Paid'),
+        (IN_TRANSIT, 'In Transit'),
+        (DELIVERED, 'Delivered'),
+        (CANCELED, 'Canceled'),
+    ]
+
+    shipment = models.ForeignKey(Shipment, on_delete=models.CASCADE, related_name='events')
+    status = models.CharField(max_length=32, choices=STATUS_CHOICES)
+    state = models.CharField(max_length=255, blank=True, null=True)
+    country = models.CharField(max_length=255, blank=True, null=True)
+    zip_code = models.CharField(max_length=255, blank=True, null=True)
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['shipment', 'timestamp'], name='shipment_event_timeline'),
+        ]
+
+    def __str__(self):
+        return f"{self.status} at {self.timestamp}"
+
 
 class Contact(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, default=False)
@@ -168,17 +315,80 @@ class Contact(models.Model):
         return f"{self.user}'s Contact Information"
 
 
-class PackageCountByLocation(models.Model):
-    location = models.ForeignKey(Location, on_delete=models.CASCADE)
-    count = models.IntegerField()
+class ShipmentDraft(models.Model):
+    # Create-shipment wizard state for one session, see drafts.py
+    session_key = models.CharField(max_length=40, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    data = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.user}'s shipment draft"
 
-class PackageCountByLocationView(LoginRequiredMixin, ListView):
-    model = PackageCountByLocation
-    template_name = 'package_count_by_location.html'
 
-    def get_queryset(self):
-        qs = super().get_queryset()
-        qs = qs.annotate(count=Count('pickup_location'))
-        return qs
+class UserShipmentStats(models.Model):
+    # Per-user dashboard summary, kept up to date by the signal handlers in
+    # signals.py. rebuild_shipment_stats recomputes it from scratch.
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='shipment_stats')
+    packages = models.PositiveIntegerField(default=0)
+    shipments = models.PositiveIntegerField(default=0)
+    pending = models.PositiveIntegerField(default=0)
+    paid = models.PositiveIntegerField(default=0)
+    in_transit = models.PositiveIntegerField(default=0)
+    delivered = models.PositiveIntegerField(default=0)
+    canceled = models.PositiveIntegerField(default=0)
+    other_status = models.PositiveIntegerField(default=0)
+    total_weight = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_spend = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    last_shipment_at = models.DateTimeField(null=True, blank=True)
 
+    STATUS_COLUMNS = {
+        ShipmentEvent.PENDING: 'pending',
+        ShipmentEvent.SUCCESSFUL: 'paid',
+        ShipmentEvent.IN_TRANSIT: 'in_transit',
+        ShipmentEvent.DELIVERED: 'delivered',
+        ShipmentEvent.CANCELED: 'canceled',
+    }
 
+    @classmethod
+    def status_column(cls, status):
+        return cls.STATUS_COLUMNS.get(status, 'other_status')
+
+    def __str__(self):
+        return f"{self.user}'s shipment stats"
+
+
+class NewsArticle(models.Model):
+    url = models.URLField(max_length=1000, unique=True)
+    title = models.CharField(max_length=500)
+    description = models.TextField(blank=True)
+    source = models.CharField(max_length=255, blank=True)
+    author = models.CharField(max_length=255, blank=True)
+    image_url = models.URLField(max_length=1000, blank=True)
+    published_at = models.DateTimeField(null=True, db_index=True)
+    fetched_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return self.title
+
+
+class PackageCountByLocation(models.Model):
+    # Live shipments (not canceled) per origin country and per drop-off
+    # station. A row has either a country or a station. Kept up to date by
+    # the signal handlers in signals.py, rebuilt by rebuild_package_counts.
+    country = models.CharField(max_length=255, null=True, blank=True)
+    station = models.ForeignKey(Stations, on_delete=models.CASCADE, null=True, blank=True)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['country'], name='package_count_unique_country'),
+            models.UniqueConstraint(fields=['station'], name='package_count_unique_station'),
+            models.CheckConstraint(
+                check=models.Q(country=None, station__isnull=False) | models.Q(country__isnull=False, station=None),
+                name='package_count_country_or_station',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.station or self.country}: {self.count}"
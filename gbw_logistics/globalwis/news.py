@@ -0,0 +1,79 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import outbound
+from .models import NewsArticle
+
+
+logger = logging.getLogger(__name__)
+
+NEWS_URL = "https://newsapi.org/v2/top-headlines"
+
+
+def fetch_articles():
+    # One request per keyword, all at once; articles are keyed by URL so an
+    # article matching several keywords is only kept once
+    params = {
+        "apiKey": settings.NEWS_API_KEY,
+        "category": "general",
+    }
+    calls = [(NEWS_URL, {"params": {**params, "q": keyword}}) for keyword in settings.NEWS_KEYWORDS]
+    articles = {}
+    for response in outbound.get_many(calls):
+        if isinstance(response, Exception) or response.status_code != 200:
+            continue
+        try:
+            payload = response.json()
+        except ValueError:
+            logger.warning("NewsAPI answered 200 with a body that isn't JSON")
+            continue
+        if not isinstance(payload, dict):
+            continue
+        for article in payload.get("articles") or []:
+            if isinstance(article, dict) and article.get("url") and article.get("title"):
+                articles.setdefault(article["url"], article)
+    return list(articles.values())
+
+
+def refresh_news():
+    # Stores new articles, refreshes known ones and drops those past the
+    # retention period. Returns (stored, pruned).
+    now = timezone.now()
+    articles = [
+        NewsArticle(
+            url=article["url"][:1000],
+            title=article["title"][:500],
+            description=article.get("description") or "",
+            source=((article.get("source") or {}).get("name") or "")[:255],
+            author=(article.get("author") or "")[:255],
+            image_url=(article.get("urlToImage") or "")[:1000],
+            published_at=parse_datetime(article["publishedAt"]) if article.get("publishedAt") else None,
+            fetched_at=now,
+        )
+        for article in fetch_articles()
+    ]
+    # fetched_at is left alone on known articles so Last-Modified only moves
+    # when something new arrives
+    NewsArticle.objects.bulk_create(
+        articles,
+        update_conflicts=True,
+        unique_fields=["url"],
+        update_fields=["title", "description", "source", "author", "image_url", "published_at"],
+    )
+
+    cutoff = now - timedelta(days=settings.NEWS_RETENTION_DAYS)
+    pruned, _ = NewsArticle.objects.filter(
+        Q(published_at__lt=cutoff) | Q(published_at__isnull=True, fetched_at__lt=cutoff)
+    ).delete()
+    return len(articles), pruned
+
+
+def feed_state():
+    # (article count, last change) for conditional GETs on the news page
+    state = NewsArticle.objects.aggregate(count=Count("id"), last_modified=Max("fetched_at"))
+    return state["count"], state["last_modified"]
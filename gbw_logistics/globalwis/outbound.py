@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+
+logger = logging.getLogger(__name__)
+
+
+# One keep-alive session per process for every outbound API call
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=settings.OUTBOUND_HTTP_POOL_CONNECTIONS,
+                    pool_maxsize=settings.OUTBOUND_HTTP_POOL_MAXSIZE,
+                )
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def timeout_for(url):
+    timeouts = settings.OUTBOUND_HTTP_TIMEOUTS
+    return timeouts.get(urlsplit(url).hostname, timeouts['default'])
+
+
+def get(url, **kwargs):
+    kwargs.setdefault('timeout', timeout_for(url))
+    return get_session().get(url, **kwargs)
+
+
+# Threads for running several calls at once. requests is blocking, so
+# concurrency means threads; one pool per process, sized like the
+# connection pool so no thread waits for a connection.
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.OUTBOUND_HTTP_POOL_MAXSIZE,
+                    thread_name_prefix='outbound',
+                )
+    return _executor
+
+
+async def aget(url, **kwargs):
+    # For async code: still a blocking requests call, run on the outbound
+    # threads so it doesn't stall the event loop
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), partial(get, url, **kwargs))
+
+
+def get_many(calls):
+    # calls: list of (url, kwargs). Runs them concurrently from sync code and
+    # returns responses (or the exception raised) in the same order. Safe to
+    # call from a thread that is running an event loop.
+    if len(calls) == 1:
+        url, kwargs = calls[0]
+        try:
+            return [get(url, **kwargs)]
+        except Exception as e:
+            return [e]
+    futures = [get_executor().submit(get, url, **kwargs) for url, kwargs in calls]
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+class CircuitBreaker:
+    # Opens after `failure_threshold` consecutive failures. While open every
+    # call is refused until `reset_timeout` seconds have passed, then a
+    # single trial call is let through (half open) to decide whether to
+    # close again.
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.warning('Circuit %s closed', self.name)
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                if self.state == self.CLOSED:
+                    self.times_opened += 1
+                    logger.warning('Circuit %s opened after %d failures', self.name, self.failures)
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'state': self.state,
+                'failures': self.failures,
+                'open_for': round(time.monotonic() - self.opened_at, 1) if self.state != self.CLOSED else None,
+                'times_opened': self.times_opened,
+                'rejected': self.rejected,
+            }
@@ -0,0 +1,136 @@
+import os
+import threading
+
+from django.conf import settings
+from django.db import connections, router
+
+from .models import PackageIdSequence
+
+
+# Package IDs look like GBW7K2M9QX4H: a prefix, 8 Crockford base32 digits
+# and a Luhn mod 32 check character, so a mistyped ID is rejected without a
+# lookup. The digits encode a number drawn from a DB sequence. Each process
+# reserves a block of numbers at a time, so handing out an ID is normally
+# just a counter increment in memory and the ID goes in with the INSERT.
+#
+# The numbers go through a fixed permutation of 0..2^40-1 before encoding so
+# consecutive packages don't get consecutive-looking IDs. That is cosmetic,
+# not a secret: anyone can work it out from this file.
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+DIGITS = 8
+SPACE = len(ALPHABET) ** DIGITS  # 2**40
+MULTIPLIER = 0x9E3779B97F  # odd, so multiplying is a bijection mod 2**40
+OFFSET = 0x5DEECE66D
+SEQUENCE = 'package_id'
+
+
+def check_character(digits):
+    # Luhn mod N over the base32 digits
+    factor = 2
+    total = 0
+    for char in reversed(digits):
+        addend = factor * ALPHABET.index(char)
+        total += addend // 32 + addend % 32
+        factor = 1 if factor == 2 else 2
+    return ALPHABET[(32 - total % 32) % 32]
+
+
+def encode(number):
+    value = (number * MULTIPLIER + OFFSET) % SPACE
+    digits = []
+    for _ in range(DIGITS):
+        value, remainder = divmod(value, 32)
+        digits.append(ALPHABET[remainder])
+    digits = ''.join(reversed(digits))
+    return settings.PACKAGE_ID_PREFIX + digits + check_character(digits)
+
+
+def is_valid(package_id):
+    # True for IDs in the current format with a correct check character
+    prefix = settings.PACKAGE_ID_PREFIX
+    package_id = str(package_id).upper()
+    if len(package_id) != len(prefix) + DIGITS + 1 or not package_id.startswith(prefix):
+        return False
+    digits, check = package_id[len(prefix):-1], package_id[-1]
+    if any(char not in ALPHABET for char in digits):
+        return False
+    return check_character(digits) == check
+
+
+def _reserve(connection, size):
+    # One short transaction on `connection`, committed before returning.
+    # The UPDATE takes the row lock, so no two callers read the same value.
+    table = connection.ops.quote_name(PackageIdSequence._meta.db_table)
+    autocommit = connection.get_autocommit()
+    connection.set_autocommit(False)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'UPDATE {table} SET next_value = next_value + %s WHERE name = %s', [size, SEQUENCE])
+            if cursor.rowcount == 0:
+                cursor.execute(f'INSERT INTO {table} (name, next_value) VALUES (%s, %s)', [SEQUENCE, 1 + size])
+            cursor.execute(f'SELECT next_value FROM {table} WHERE name = %s', [SEQUENCE])
+            end = cursor.fetchone()[0]
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+    finally:
+        connection.set_autocommit(autocommit)
+    return end
+
+
+def reserve_block(size):
+    # Returns the range of sequence numbers now owned by the caller. The
+    # block outlives the request in process memory, so the reservation must
+    # commit on its own: if it rode along in the caller's transaction a
+    # rollback would hand the same numbers to the next process too. Inside
+    # an atomic block it goes through a separate connection. (On SQLite that
+    # connection waits for the caller's locks, so allocate before opening
+    # a transaction there.)
+    alias = router.db_for_write(PackageIdSequence)
+    connection = connections[alias]
+    if connection.in_atomic_block:
+        connection = connections.create_connection(alias)
+        try:
+            end = _reserve(connection, size)
+        finally:
+            connection.close()
+    else:
+        end = _reserve(connection, size)
+    if end > SPACE:
+        raise RuntimeError('Package ID space exhausted')
+    return range(end - size, end)
+
+
+class Allocator:
+    def __init__(self, block_size):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._block = iter(())
+        self._pid = None
+
+    def allocate(self):
+        with self._lock:
+            # A forked worker must not reuse the numbers its parent reserved
+            if self._pid != os.getpid():
+                self._block = iter(())
+                self._pid = os.getpid()
+            number = next(self._block, None)
+            if number is None:
+                self._block = iter(reserve_block(self.block_size))
+                number = next(self._block)
+        return encode(number)
+
+
+_allocator = None
+_allocator_lock = threading.Lock()
+
+
+def new_package_id():
+    global _allocator
+    if _allocator is None:
+        with _allocator_lock:
+            if _allocator is None:
+                _allocator = Allocator(settings.PACKAGE_ID_BLOCK_SIZE)
+    return _allocator.allocate()
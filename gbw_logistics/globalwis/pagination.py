@@ -0,0 +1,46 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+from .projections import project
+
+
+# Keyset pagination over (date, id), newest first. The cursor is the sort key
+# of the last row shown, so a page is one indexed range scan however deep
+# into the list it is, and rows added meanwhile don't shift later pages.
+
+
+def encode_cursor(row):
+    value = f'{row.date.isoformat()}|{row.pk}'
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    # (date, id) or None for a missing or malformed cursor
+    if not cursor:
+        return None
+    try:
+        value = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        date, pk = value.split('|')
+        return datetime.fromisoformat(date), int(pk)
+    except ValueError:
+        return None
+
+
+def keyset_page(queryset, cursor, page_size, row_class=None):
+    # Returns (rows, next_cursor); next_cursor is None on the last page.
+    # With a row_class the page is fetched as projected rows, which must
+    # include date and pk.
+    queryset = queryset.order_by('-date', '-id')
+    position = decode_cursor(cursor)
+    if position is not None:
+        date, pk = position
+        queryset = queryset.filter(Q(date__lt=date) | Q(date=date, id__lt=pk))
+    if row_class is not None:
+        queryset = project(queryset, row_class)
+    rows = list(queryset[:page_size + 1])
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
@@ -0,0 +1,31 @@
+import hashlib
+import hmac
+
+from django.conf import settings
+
+from .models import Payment
+
+
+def card_fingerprint(card_number, expiry_month, expiry_year, cardholder_name):
+    # Keyed hash of what identifies a card, so the same card maps to one
+    # Payment row without the card details being searchable. The CVV is
+    # not part of it and is never stored. Changing the format orphans the
+    # stored fingerprints (migration 0017 keeps its own copy of this).
+    number = ''.join(c for c in str(card_number) if c.isdigit())
+    name = ' '.join(str(cardholder_name).split()).casefold()
+    message = f'{number}|{int(expiry_month):02d}|{int(expiry_year)}|{name}'
+    key = settings.PAYMENT_FINGERPRINT_KEY.encode()
+    return hmac.new(key, message.encode(), hashlib.sha256).hexdigest()
+
+
+def get_or_create_payment(values):
+    # One lookup on the unique fingerprint index. get_or_create retries the
+    # read when a concurrent request inserted the same card first.
+    fingerprint = card_fingerprint(
+        values['card_number'],
+        values['card_expiry_month'],
+        values['card_expiry_year'],
+        values['cardholder_name'],
+    )
+    payment, _ = Payment.objects.get_or_create(fingerprint=fingerprint, defaults=values)
+    return payment
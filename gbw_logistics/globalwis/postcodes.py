@@ -0,0 +1,107 @@
+import mmap
+import os
+import struct
+import threading
+
+from django.conf import settings
+
+
+# Index file layout: an 8 byte magic, a record count, then fixed-size records
+# sorted by key. A key is the 2 letter country code followed by the
+# normalized postcode, NUL padded, so plain byte comparison gives the order.
+MAGIC = b'GBWPC1\0\0'
+HEADER = struct.Struct('<8sI')
+KEY_SIZE = 16
+RECORD = struct.Struct(f'<{KEY_SIZE}s2f')
+
+
+def normalize_postcode(postcode):
+    code = str(postcode).upper().replace(' ', '').replace('-', '')
+    # Zip codes reach us through IntegerFields, so "02134" arrives as 2134
+    if code.isdigit():
+        code = code.lstrip('0') or '0'
+    return code
+
+
+def make_key(country, postcode):
+    key = (str(country).upper()[:2] + normalize_postcode(postcode)).encode('ascii', 'ignore')
+    return key[:KEY_SIZE].ljust(KEY_SIZE, b'\0')
+
+
+def build_index(rows, path):
+    # rows: iterable of (country, postcode, lat, lng). Postcodes shared by
+    # several places are stored once, at the average of their coordinates.
+    points = {}
+    for country, postcode, lat, lng in rows:
+        key = make_key(country, postcode)
+        total = points.get(key)
+        if total is None:
+            points[key] = [lat, lng, 1]
+        else:
+            total[0] += lat
+            total[1] += lng
+            total[2] += 1
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(points)))
+        for key in sorted(points):
+            lat, lng, n = points[key]
+            f.write(RECORD.pack(key, lat / n, lng / n))
+    os.replace(tmp_path, path)
+    return len(points)
+
+
+class PostcodeIndex:
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a postcode index')
+
+    def __len__(self):
+        return self.count
+
+    def key_at(self, i):
+        offset = HEADER.size + i * RECORD.size
+        return self._map[offset:offset + KEY_SIZE]
+
+    def lookup(self, country, postcode):
+        key = make_key(country, postcode)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self.key_at(lo) == key:
+            _, lat, lng = RECORD.unpack_from(self._map, HEADER.size + lo * RECORD.size)
+            return lat, lng
+        return None
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    # None until build_postcode_index has been run
+    global _index
+    if _index is None and os.path.exists(settings.POSTCODE_INDEX_PATH):
+        with _index_lock:
+            if _index is None:
+                _index = PostcodeIndex(settings.POSTCODE_INDEX_PATH)
+    return _index
+
+
+def lookup(country, postcode):
+    index = get_index()
+    if index is None or postcode in (None, ''):
+        return None
+    return index.lookup(country, postcode)
@@ -0,0 +1,137 @@
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+
+
+# All arithmetic is done on int64 fixed point values:
+#   weights in 1/100 kg, dimensions in 1/100 cm, distances in metres,
+#   prices in cents.
+
+# Upper bounds of the inputs. Weights and dimensions match the
+# DecimalField(max_digits=5, decimal_places=2) columns on Package and Quote;
+# no two places on Earth are further apart than half its circumference.
+MAX_WEIGHT = 999.99  # kg
+MAX_DIMENSION = 999.99  # cm
+MAX_DISTANCE_KM = 20040
+INT64_MAX = np.iinfo(np.int64).max
+
+
+class InvalidPackage(ValueError):
+    # `row` is the 0-based index of the offending package in the batch
+    def __init__(self, row, field, value, reason):
+        self.row = row
+        self.field = field
+        super().__init__(f'Package {row + 1}: {field} {value!r} {reason}')
+
+
+class RateCard:
+    def __init__(self, name, volumetric_divisor=5000, volumetric_rate_cents=100, rate_per_km_cents=10, minimum_cents=0):
+        self.name = name
+        self.volumetric_divisor = volumetric_divisor  # cm³ per kg of volumetric weight
+        self.volumetric_rate_cents = volumetric_rate_cents  # per kg of weight per kg of volumetric weight
+        self.rate_per_km_cents = rate_per_km_cents
+        self.minimum_cents = minimum_cents
+
+    def __repr__(self):
+        return f'<RateCard {self.name}>'
+
+
+def get_rate_card(name=None):
+    name = name or settings.PRICING_DEFAULT_RATE_CARD
+    try:
+        return RateCard(name, **settings.PRICING_RATE_CARDS[name])
+    except KeyError:
+        raise ValueError(f'Unknown rate card: {name}')
+
+
+def to_fixed(values, scale):
+    return np.rint(np.asarray(values, dtype=np.float64) * scale).astype(np.int64)
+
+
+def _as_array(field, values):
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (ValueError, TypeError):
+        for row, value in enumerate(values):
+            try:
+                float(value)
+            except (ValueError, TypeError):
+                raise InvalidPackage(row, field, value, 'is not a number')
+        raise
+
+
+def _validated(field, values, maximum):
+    # Positive, finite and no more than `maximum`
+    array = _as_array(field, values)
+    bad = ~np.isfinite(array) | (array <= 0) | (array > maximum)
+    if bad.any():
+        row = int(np.argmax(bad))
+        raise InvalidPackage(row, field, values[row], f'must be above 0 and at most {maximum}')
+    return array
+
+
+def _validated_distances(values):
+    # NaN stands for an unknown distance; anything else must be in range
+    array = _as_array('distance_km', values)
+    bad = ~np.isnan(array) & (~np.isfinite(array) | (array < 0) | (array > MAX_DISTANCE_KM))
+    if bad.any():
+        row = int(np.argmax(bad))
+        raise InvalidPackage(row, 'distance_km', values[row], f'must be between 0 and {MAX_DISTANCE_KM}')
+    return array
+
+
+def _check_overflow(*factors):
+    # Largest product the int64 arithmetic will see, in Python's unbounded ints
+    product = 1
+    for factor in factors:
+        product *= factor
+    if product > INT64_MAX:
+        raise ValueError('Rate card values are too large to price these packages')
+
+
+def _divide_round(numerator, denominator):
+    # Round half up integer division for non-negative int64 arrays
+    return (numerator + denominator // 2) // denominator
+
+
+def price_packages(weight, length, width, height, distance_km=None, rate_card=None):
+    # Prices a batch of packages in one pass. Every argument holds one entry
+    # per package; a NaN distance means unknown and only the base price is
+    # charged. Returns an int64 array of prices in cents. Raises
+    # InvalidPackage for the first out of range value.
+    rate_card = rate_card or get_rate_card()
+
+    weight_c = to_fixed(_validated('weight', weight, MAX_WEIGHT), 100)
+    length_c = to_fixed(_validated('length', length, MAX_DIMENSION), 100)
+    width_c = to_fixed(_validated('width', width, MAX_DIMENSION), 100)
+    height_c = to_fixed(_validated('height', height, MAX_DIMENSION), 100)
+    if not len(weight_c):
+        return np.zeros(0, dtype=np.int64)
+
+    max_volumetric = round(MAX_DIMENSION * 100) ** 3 // (10_000 * rate_card.volumetric_divisor) + 1
+    _check_overflow(round(MAX_WEIGHT * 100), max_volumetric, rate_card.volumetric_rate_cents)
+    volume = length_c * width_c * height_c  # 1e-6 cm³
+    volumetric_c = _divide_round(volume, 10_000 * rate_card.volumetric_divisor)  # 1/100 kg
+    base = _divide_round(weight_c * volumetric_c * rate_card.volumetric_rate_cents, 10_000)
+
+    if distance_km is None:
+        distance_cost = np.zeros_like(base)
+    else:
+        distance_km = _validated_distances(distance_km)
+        _check_overflow(MAX_DISTANCE_KM * 1000, rate_card.rate_per_km_cents)
+        metres = to_fixed(np.nan_to_num(distance_km, nan=0.0), 1000)
+        distance_cost = _divide_round(metres * rate_card.rate_per_km_cents, 1000)
+
+    return np.maximum(base + distance_cost, rate_card.minimum_cents)
+
+
+def cents_to_decimal(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def quote_price(weight, length, width, height, distance_km=None, rate_card=None):
+    # Single package helper for the quote form, same arithmetic as the batch path
+    distance = None if distance_km is None else [distance_km]
+    cents = price_packages([weight], [length], [width], [height], distance, rate_card)[0]
+    return cents_to_decimal(cents)
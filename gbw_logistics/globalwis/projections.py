@@ -0,0 +1,102 @@
+# Read-only row objects for list and table pages. A row class names the
+# columns a page displays; only those are selected (values_list) and each row
+# is a __slots__ object instead of a full model instance with its field
+# cache, _state and every unused column.
+
+
+class Row:
+    __slots__ = ()
+    # attribute name -> ORM lookup, in __slots__ order
+    columns = {}
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return f'<{type(self).__name__} {self.pk}>'
+
+
+class Projection:
+    # Lazy, sliceable stand-in for a queryset that yields row objects, so
+    # Paginator and ListView can use it unchanged
+    def __init__(self, queryset, row_class):
+        self.model = queryset.model
+        self.row_class = row_class
+        self.queryset = queryset.values_list(*row_class.columns.values())
+
+    @property
+    def ordered(self):
+        return self.queryset.ordered
+
+    def count(self):
+        return self.queryset.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        row_class = self.row_class
+        for values in self.queryset:
+            yield row_class(*values)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self.row_class(*values) for values in self.queryset[key]]
+        return self.row_class(*self.queryset[key])
+
+
+def project(queryset, row_class):
+    return Projection(queryset, row_class)
+
+
+class ShipmentListRow(Row):
+    columns = {
+        'pk': 'pk',
+        'date': 'date',
+        'package_id': 'package__package_id',
+        'origin': 'origin',
+        'destination': 'destination',
+        'weight': 'weight',
+        'description': 'description',
+        'status': 'status',
+        'sender_company': 'contact_info__sender_company',
+        'sender_name': 'contact_info__sender_name',
+        'sender_state': 'contact_info__sender_state',
+        'sender_email': 'contact_info__sender_email',
+        'receiver_company': 'contact_info__receiver_company',
+        'receiver_name': 'contact_info__receiver_name',
+        'receiver_state': 'contact_info__receiver_state',
+        'drop_off_name': 'drop_off_location__name',
+        'drop_off_address': 'drop_off_location__address',
+        'drop_off_state': 'drop_off_location__state',
+        'pick_up_name': 'pick_up_location__name',
+        'pick_up_address': 'pick_up_location__address',
+        'pick_up_state': 'pick_up_location__state',
+    }
+    __slots__ = tuple(columns)
+
+
+class PackageRow(Row):
+    columns = {
+        'pk': 'pk',
+        'package_id': 'package_id',
+        'pickup_country': 'pickup_country',
+        'delivery_country': 'delivery_country',
+        'weight': 'weight',
+        'created_at': 'created_at',
+    }
+    __slots__ = tuple(columns)
+
+
+class LocationRow(Row):
+    columns = {
+        'pk': 'pk',
+        'name': 'name',
+        'address': 'address',
+        'zip_code': 'zip_code',
+        'state': 'state',
+        'country': 'country',
+        'image': 'image',
+    }
+    __slots__ = tuple(columns)
@@ -0,0 +1,100 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import stats
+from .broker import get_broker
+from .models import Package, Shipment, UserShipmentStats
+from .tracking import tracking_payload
+
+
+@receiver(post_save, sender=Shipment)
+def publish_shipment_update(sender, instance, **kwargs):
+    # Pushes the new tracking state to anyone following the package, once
+    # the change is committed
+    package = instance.package
+    if package is None or not package.package_id:
+        return
+    payload = tracking_payload(package, instance)
+    transaction.on_commit(lambda: get_broker().publish(package.package_id, payload))
+
+
+# Aggregates. Each handler turns a save or delete into deltas for the
+# owner's UserShipmentStats row and the PackageCountByLocation rows. Spend is
+# counted when a shipment gets its payment attached, which is a Shipment save.
+
+@receiver(post_save, sender=Package)
+def package_saved(sender, instance, created, **kwargs):
+    weight = Decimal(str(instance.weight or 0))
+    if created:
+        stats.apply_deltas(instance.sender_id, packages=1, total_weight=weight)
+    elif hasattr(instance, '_loaded_weight'):
+        stats.apply_deltas(instance.sender_id, total_weight=weight - (instance._loaded_weight or 0))
+    instance._loaded_weight = weight
+
+
+@receiver(post_delete, sender=Package)
+def package_deleted(sender, instance, **kwargs):
+    weight = Decimal(str(instance.weight or 0))
+    stats.apply_deltas(instance.sender_id, packages=-1, total_weight=-weight)
+
+
+@receiver(post_save, sender=Shipment)
+def shipment_saved(sender, instance, created, **kwargs):
+    if created:
+        loaded = dict.fromkeys(Shipment.TRACKED_FIELDS)
+    elif hasattr(instance, '_loaded'):
+        loaded = instance._loaded
+    else:
+        # Saved without being loaded first, nothing to compare against
+        return
+    instance.remember_loaded()
+
+    stats.apply_location_deltas(
+        [] if created else stats.location_keys(loaded['status'], loaded['origin'], loaded['drop_off_location_id']),
+        stats.location_keys(instance.status, instance.origin, instance.drop_off_location_id),
+    )
+
+    deltas = {}
+    if created:
+        deltas['shipments'] = 1
+        deltas[UserShipmentStats.status_column(instance.status)] = 1
+    elif instance.status != loaded['status']:
+        deltas[UserShipmentStats.status_column(loaded['status'])] = -1
+        deltas[UserShipmentStats.status_column(instance.status)] = 1
+    paid = instance.payment_id is not None
+    was_paid = loaded['payment_id'] is not None
+    if not deltas and paid == was_paid:
+        return
+
+    user_id, price = stats.shipment_owner(instance)
+    if user_id is None:
+        return
+    if paid != was_paid:
+        deltas['total_spend'] = price if paid else -price
+    stats.apply_deltas(user_id, **deltas)
+    if created:
+        UserShipmentStats.objects.filter(user_id=user_id).update(last_shipment_at=instance.date)
+
+
+@receiver(pre_delete, sender=Shipment)
+def shipment_deleting(sender, instance, **kwargs):
+    # Look the owner up while the package still exists; deleting a package
+    # cascades to its shipments
+    instance._owner = stats.shipment_owner(instance)
+
+
+@receiver(post_delete, sender=Shipment)
+def shipment_deleted(sender, instance, **kwargs):
+    stats.apply_location_deltas(stats.location_keys(instance.status, instance.origin, instance.drop_off_location_id), [])
+
+    user_id, price = getattr(instance, '_owner', (None, None))
+    if user_id is None:
+        return
+    deltas = {'shipments': -1, UserShipmentStats.status_column(instance.status): -1}
+    if instance.payment_id is not None:
+        deltas['total_spend'] = -price
+    stats.apply_deltas(user_id, **deltas)
+    stats.refresh_last_shipment(user_id)
@@ -0,0 +1,126 @@
+from collections import Counter
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import Greatest
+
+from .models import Package, PackageCountByLocation, Shipment, ShipmentEvent, UserShipmentStats
+
+
+def apply_deltas(user_id, **deltas):
+    # Adds each delta to the user's stats row in one UPDATE, creating the
+    # row on first use. F() expressions keep concurrent updates from
+    # overwriting each other. Values stop at zero: rows written behind the
+    # signals' back (bulk_create, raw SQL) can leave a row short, and a
+    # negative count must not make the delete that exposed it fail.
+    # rebuild_shipment_stats repairs the drift.
+    changes = {field: Greatest(F(field) + delta, 0) for field, delta in deltas.items() if delta}
+    if not changes:
+        return
+    if UserShipmentStats.objects.filter(user_id=user_id).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            UserShipmentStats.objects.create(user_id=user_id)
+    except IntegrityError:
+        pass  # created by a concurrent request
+    UserShipmentStats.objects.filter(user_id=user_id).update(**changes)
+
+
+def shipment_owner(shipment):
+    # (user id, quoted price) of the shipment's package
+    row = Package.objects.filter(pk=shipment.package_id).values_list('sender_id', 'quote__price').first()
+    if row is None:
+        return None, None
+    return row[0], row[1] or Decimal('0')
+
+
+def refresh_last_shipment(user_id):
+    last = Shipment.objects.filter(package__sender_id=user_id).aggregate(last=Max('date'))['last']
+    UserShipmentStats.objects.filter(user_id=user_id).update(last_shipment_at=last)
+
+
+def rebuild_stats():
+    # Recomputes every user's row with three grouped queries
+    stats = {}
+
+    def row(user_id):
+        if user_id not in stats:
+            stats[user_id] = UserShipmentStats(user_id=user_id)
+        return stats[user_id]
+
+    for item in Package.objects.values('sender_id').annotate(n=Count('id'), weight=Sum('weight')).order_by():
+        entry = row(item['sender_id'])
+        entry.packages = item['n']
+        entry.total_weight = item['weight'] or 0
+
+    shipments = Shipment.objects.filter(package__isnull=False).values('package__sender_id', 'status')
+    for item in shipments.annotate(n=Count('id'), last=Max('date')).order_by():
+        entry = row(item['package__sender_id'])
+        column = UserShipmentStats.status_column(item['status'])
+        setattr(entry, column, getattr(entry, column) + item['n'])
+        entry.shipments += item['n']
+        if entry.last_shipment_at is None or item['last'] > entry.last_shipment_at:
+            entry.last_shipment_at = item['last']
+
+    paid = Shipment.objects.filter(package__isnull=False, payment__isnull=False).values('package__sender_id')
+    for item in paid.annotate(spend=Sum('package__quote__price')).order_by():
+        row(item['package__sender_id']).total_spend = item['spend'] or 0
+
+    with transaction.atomic():
+        UserShipmentStats.objects.all().delete()
+        UserShipmentStats.objects.bulk_create(stats.values(), batch_size=1000)
+    return len(stats)
+
+
+def location_keys(status, origin, station_id):
+    # The PackageCountByLocation rows a shipment counts towards
+    if status == ShipmentEvent.CANCELED:
+        return []
+    keys = []
+    if origin not in (None, '', 'False'):
+        keys.append(('country', origin))
+    if station_id is not None:
+        keys.append(('station', station_id))
+    return keys
+
+
+def apply_location_deltas(old_keys, new_keys):
+    deltas = Counter(new_keys)
+    deltas.subtract(old_keys)
+    for (kind, value), delta in deltas.items():
+        if not delta:
+            continue
+        lookup = {'country': value} if kind == 'country' else {'station_id': value}
+        rows = PackageCountByLocation.objects.filter(**lookup)
+        if rows.update(count=F('count') + delta) or delta < 0:
+            # A missing row on a decrement was removed with its station
+            continue
+        try:
+            with transaction.atomic():
+                PackageCountByLocation.objects.create(count=delta, **lookup)
+        except IntegrityError:
+            rows.update(count=F('count') + delta)
+
+
+def rebuild_location_counts():
+    # One GROUP BY over live shipments, split into country and station rows
+    countries = Counter()
+    stations = Counter()
+    groups = (
+        Shipment.objects.exclude(status=ShipmentEvent.CANCELED)
+        .values_list('origin', 'drop_off_location_id')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    for origin, station_id, n in groups:
+        for kind, value in location_keys(None, origin, station_id):
+            (countries if kind == 'country' else stations)[value] += n
+
+    rows = [PackageCountByLocation(country=country, count=n) for country, n in countries.items()]
+    rows += [PackageCountByLocation(station_id=station_id, count=n) for station_id, n in stations.items()]
+    with transaction.atomic():
+        PackageCountByLocation.objects.all().delete()
+        PackageCountByLocation.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
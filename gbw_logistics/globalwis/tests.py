@@ -1,3 +1,508 @@
 from django.test import TestCase
 
 # Create your tests here.
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from decimal import Decimal
+from unittest import mock
+
+import numpy as np
+from PIL import Image
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import admin, images, news, outbound, package_ids, pricing, stats
+from .broker import get_broker
+from .forms import ImageUploadForm
+from .management.commands.check_package_ids import allocate_in_processes
+from .models import LocationDistance, Package, PackageCountByLocation, Payment, Quote, Shipment, ShipmentDraft, ShipmentEvent, Stations, UserShipmentStats
+
+
+_inherited_allocator = None
+
+
+def _allocate_inherited(count):
+    # Runs in a forked pool worker, on the allocator the parent had
+    ids = [_inherited_allocator.allocate() for _ in range(count)]
+    connections.close_all()
+    return ids
+
+
+class PackageIdAllocatorTests(TransactionTestCase):
+    def test_concurrent_allocators_hand_out_unique_ids(self):
+        # Small blocks so the threads keep going back to the sequence row
+        threads, per_thread, block_size = 8, 500, 7
+        results = []
+        errors = []
+        start = threading.Barrier(threads)
+
+        def allocate():
+            allocator = package_ids.Allocator(block_size)
+            try:
+                start.wait()
+                results.append([allocator.allocate() for _ in range(per_thread)])
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=allocate) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        ids = [package_id for batch in results for package_id in batch]
+        self.assertEqual(len(ids), threads * per_thread)
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertTrue(all(package_ids.is_valid(package_id) for package_id in ids))
+
+    def test_spawned_processes_hand_out_unique_ids(self):
+        # The opt-in check_package_ids command does the same with millions of IDs
+        results = allocate_in_processes(4, 2000, 50, database_name=connection.settings_dict['NAME'])
+        ids = [package_id for batch, _ in results for package_id in batch]
+        self.assertEqual(sum(bad for _, bad in results), 0)
+        self.assertEqual(len(ids), 4 * 2000)
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_forked_worker_does_not_reuse_parent_block(self):
+        global _inherited_allocator
+        _inherited_allocator = package_ids.Allocator(100)
+        parent_ids = [_inherited_allocator.allocate()]
+        # Forked servers close inherited connections the same way
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(2) as pool:
+            child_ids = pool.map(_allocate_inherited, [50, 50])
+        parent_ids += [_inherited_allocator.allocate() for _ in range(50)]
+        ids = parent_ids + child_ids[0] + child_ids[1]
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_rolled_back_transaction_keeps_reservation(self):
+        first = package_ids.Allocator(5)
+        with self.assertRaises(ZeroDivisionError):
+            with transaction.atomic():
+                first.allocate()
+                1 / 0
+        second = package_ids.Allocator(5)
+        ids = [first.allocate() for _ in range(4)] + [second.allocate() for _ in range(5)]
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_new_package_id_is_valid(self):
+        package_id = package_ids.new_package_id()
+        self.assertTrue(package_ids.is_valid(package_id))
+        self.assertFalse(package_ids.is_valid(package_id[:-1] + ('0' if package_id[-1] != '0' else '1')))
+
+
+CHECKOUT_FIELDS = {
+    'sender_name': 'Ann', 'sender_address': '1 St', 'sender_city': 'NY', 'sender_state': 'NY',
+    'sender_email': 'a@x.com', 'sender_phone_type': 'm', 'sender_phone_code': '1', 'sender_phone_number': '555',
+    'receiver_name': 'Bob', 'receiver_address': '2 Rd', 'receiver_city': 'L', 'receiver_state': 'LN',
+    'receiver_email': 'b@x.com', 'receiver_phone_type': 'm', 'receiver_phone_code': '44', 'receiver_phone_number': '777',
+}
+
+
+class CheckoutQueryTests(TestCase):
+    def setUp(self):
+        LocationDistance.objects.create(pickup_country='US', delivery_country='GB', distance_km=5500)
+        self.user = User.objects.create_user('checkout', 'a@x.com', 'pw')
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('create_shipment'), {
+            'pickup_country': 'US', 'pickup_zip': 10001, 'delivery_country': 'GB', 'delivery_zip': 1,
+            'weight': 2, 'length': 10, 'width': 10, 'height': 10,
+        })
+        self.assertEqual(response.status_code, 302)
+
+    def test_checkout_query_budget(self):
+        # Session, user, quote, contact and draft (each read once through the
+        # identity map) and the draft update. Nothing else is written until payment.
+        with self.assertNumQueries(6):
+            response = self.client.post(reverse('checkout'), CHECKOUT_FIELDS)
+        self.assertRedirects(response, reverse('shipment_details'), fetch_redirect_response=False)
+        self.assertIn('checkout', ShipmentDraft.objects.get(user=self.user).data)
+
+
+class TrackStreamTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('stream')
+        Package.objects.create(sender=user, weight=1, package_id='GBWSTREAM')
+
+    @override_settings(TRACKING_STREAM_HEARTBEAT=0.01, TRACKING_STREAM_MAX_AGE=0.05)
+    async def test_stream_ends_and_unsubscribes(self):
+        response = await self.async_client.get(reverse('track_stream', args=['GBWSTREAM']))
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertIn(b'event: status', b''.join(chunks))
+        self.assertIn(b': keep-alive', b''.join(chunks))
+        self.assertEqual(get_broker().subscriber_count(), 0)
+
+    def test_wsgi_sends_status_once(self):
+        # The WSGI handler reads the whole body before sending it, which
+        # only works because the stream stops after the first event
+        response = self.client.get(reverse('track_stream', args=['GBWSTREAM']))
+        body = b''.join(response)
+        self.assertIn(b'event: status', body)
+        self.assertNotIn(b'keep-alive', body)
+
+
+class ShowPriceTests(TestCase):
+    def test_bad_quote_parameter(self):
+        self.client.force_login(User.objects.create_user('price'))
+        response = self.client.get(reverse('show_price'), {'quote': 'abc'})
+        self.assertEqual(response.status_code, 302)
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        self.enterContext(override_settings(IMAGE_STORE_ROOT=root, IMAGE_WORKERS=1))
+        buffer = io.BytesIO()
+        Image.new('RGB', (800, 400), 'red').save(buffer, 'PNG')
+        upload = SimpleUploadedFile('photo.png', buffer.getvalue(), 'image/png')
+        form = ImageUploadForm({}, {'image': upload})
+        self.assertTrue(form.is_valid())
+        self.name = images.store_upload(form.cleaned_data['image'])
+
+    def test_pool_is_rebuilt_after_a_worker_dies(self):
+        # A worker that exits abruptly breaks the pool for every later submit
+        with self.assertRaises(BrokenProcessPool):
+            images.get_executor().submit(os._exit, 1).result(timeout=60)
+        future = images.schedule_variants(self.name)
+        self.assertEqual(sorted(future.result(timeout=60)), sorted(settings.IMAGE_VARIANTS))
+
+
+class ShipmentAdminTests(TestCase):
+    def test_changelist_filters_do_not_scan_for_distinct_values(self):
+        admin_user = User.objects.create_superuser('admin', 'admin@x.com', 'pw')
+        self.client.force_login(admin_user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:globalwis_shipment_changelist'), {'origin': 'United Kingdom'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q['sql'] for q in queries if 'DISTINCT' in q['sql']])
+
+
+class RecordEventTests(TestCase):
+    def test_location_is_kept_unless_given(self):
+        package = Package.objects.create(sender=User.objects.create_user('events'), weight=1)
+        shipment = Shipment.objects.create(package=package, status=ShipmentEvent.PENDING)
+        shipment.record_event(ShipmentEvent.IN_TRANSIT, state='NY', country='US', zip_code='10001')
+        shipment.record_event(ShipmentEvent.IN_TRANSIT, zip_code='10002')
+        self.assertEqual((shipment.current_state, shipment.current_country, shipment.current_zip), ('NY', 'US', '10002'))
+        shipment.record_event(ShipmentEvent.DELIVERED, state='', zip_code='')
+        shipment.refresh_from_db()
+        self.assertEqual((shipment.current_state, shipment.current_country, shipment.current_zip), ('', 'US', ''))
+        self.assertEqual(shipment.latest_event.status, ShipmentEvent.DELIVERED)
+
+
+class CommitDraftTests(TransactionTestCase):
+    def test_package_id_is_allocated_outside_the_transaction(self):
+        LocationDistance.objects.create(pickup_country='US', delivery_country='GB', distance_km=5500)
+        user = User.objects.create_user('wizard')
+        self.client.force_login(user)
+        self.client.post(reverse('create_shipment'), {
+            'pickup_country': 'US', 'pickup_zip': 10001, 'delivery_country': 'GB', 'delivery_zip': 1,
+            'weight': 2, 'length': 10, 'width': 10, 'height': 10,
+        })
+        self.client.post(reverse('checkout'), CHECKOUT_FIELDS)
+        self.client.post(reverse('shipment_details'), {'shipping_type': 'packages', 'description': 'Books', 'value': '12.50'})
+        self.client.post(reverse('packaging'), {'packaging_type': 'box', 'quantity': 1, 'weight': '1.5'})
+
+        def allocate():
+            self.assertFalse(connection.in_atomic_block)
+            return package_ids.new_package_id()
+
+        with mock.patch('globalwis.drafts.new_package_id', side_effect=allocate) as allocated:
+            response = self.client.post(reverse('payment'), {
+                'card_type': 'debit_card', 'card_brand': 'visa', 'cardholder_name': 'Ann',
+                'card_number': '4111 1111 1111 1111', 'card_expiry_month': 1, 'card_expiry_year': 2030, 'card_cvv': 123,
+            })
+        self.assertRedirects(response, reverse('payment_success'), fetch_redirect_response=False)
+        allocated.assert_called_once()
+        self.assertTrue(package_ids.is_valid(Shipment.objects.get().package.package_id))
+
+
+class PricingTests(SimpleTestCase):
+    def old_price_cents(self, weight, length, width, height, distance_km):
+        # The formula QuotesCreateView used before the fixed point engine
+        return (weight * ((height * width * length) / 5000) + distance_km * 0.1) * 100
+
+    def test_known_prices(self):
+        cents = pricing.price_packages([2, 1.5], [10, 20], [10, 20], [10, 20], [100, float('nan')])
+        self.assertEqual(cents.tolist(), [1040, 240])
+        self.assertEqual(pricing.quote_price(2, 10, 10, 10, 100), Decimal('10.40'))
+        self.assertEqual(pricing.quote_price(2, 10, 10, 10), Decimal('0.40'))
+
+    def test_parity_with_old_formula(self):
+        # Volumetric weight is rounded to 1/100 kg before it is multiplied by
+        # the weight, so the two can differ by half a cent per kg
+        rng = np.random.default_rng(4)
+        weight, length, width, height = (np.round(rng.uniform(0.01, 999.99, 5000), 2) for _ in range(4))
+        distance = np.round(rng.uniform(0, 20000, 5000), 1)
+        cents = pricing.price_packages(weight, length, width, height, distance)
+        old = np.rint(self.old_price_cents(weight, length, width, height, distance))
+        self.assertTrue((np.abs(cents - old) <= weight * 0.5 + 1).all())
+
+    def test_largest_package_does_not_overflow(self):
+        cents = pricing.price_packages([999.99], [999.99], [999.99], [999.99], [pricing.MAX_DISTANCE_KM])
+        expected = self.old_price_cents(999.99, 999.99, 999.99, 999.99, pricing.MAX_DISTANCE_KM)
+        self.assertAlmostEqual(int(cents[0]), expected, delta=999.99 * 0.5 + 1)
+
+    def test_rejects_bad_values(self):
+        cases = [
+            ('weight', {'weight': [2, float('nan')]}),
+            ('weight', {'weight': [2, -5]}),
+            ('weight', {'weight': [2, 0]}),
+            ('weight', {'weight': [2, 'heavy']}),
+            ('length', {'length': [10, 99999]}),
+            ('height', {'height': [10, float('inf')]}),
+            ('distance_km', {'distance_km': [100, float('inf')]}),
+            ('distance_km', {'distance_km': [100, -1]}),
+        ]
+        for field, override in cases:
+            values = {'weight': [2, 2], 'length': [10, 10], 'width': [10, 10], 'height': [10, 10], 'distance_km': [100, 100]}
+            values.update(override)
+            with self.subTest(field=field, value=override[field][1]):
+                with self.assertRaises(pricing.InvalidPackage) as raised:
+                    pricing.price_packages(**values)
+                self.assertEqual((raised.exception.row, raised.exception.field), (1, field))
+
+    def test_oversized_rate_card_is_refused(self):
+        card = pricing.RateCard('huge', volumetric_divisor=1, volumetric_rate_cents=10 ** 9)
+        with self.assertRaises(ValueError):
+            pricing.price_packages([1], [1], [1], [1], rate_card=card)
+
+
+class BulkQuoteTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('bulk'))
+
+    def post(self, packages):
+        return self.client.post(reverse('bulk_quote'), json.dumps(packages), content_type='application/json')
+
+    def test_bad_row_is_named(self):
+        good = {'reference': 'a', 'pickup_country': 'US', 'delivery_country': 'GB', 'weight': 2, 'length': 10, 'width': 10, 'height': 10}
+        response = self.post([good, dict(good, reference='b', length=99999)])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['row'], 1)
+        self.assertEqual(response.json()['reference'], 'b')
+        self.assertIn('length', response.json()['error'])
+
+    def test_prices_valid_rows(self):
+        # No distance known for the pair, so the base price
+        response = self.post([{'reference': 'a', 'pickup_country': 'US', 'delivery_country': 'GB', 'weight': 2, 'length': 10, 'width': 10, 'height': 10}])
+        self.assertEqual(response.status_code, 200)
+        row = json.loads(b''.join(response.streaming_content))
+        self.assertEqual((row['reference'], row['distance_km'], row['price_cents']), ('a', None, 40))
+
+
+class NewsRefreshTests(TestCase):
+    def test_non_json_answer_is_skipped(self):
+        broken = mock.Mock(status_code=200)
+        broken.json.side_effect = ValueError('not json')
+        working = mock.Mock(status_code=200)
+        working.json.return_value = {'articles': [{'url': 'https://x/1', 'title': 'One'}]}
+        with mock.patch('globalwis.news.outbound.get_many', return_value=[broken, working, RuntimeError('down')]):
+            self.assertEqual([article['url'] for article in news.fetch_articles()], ['https://x/1'])
+
+    def test_loop_survives_a_failed_refresh(self):
+        class Stop(Exception):
+            pass
+
+        refresh = mock.Mock(side_effect=[RuntimeError('db down'), (1, 0)])
+        with mock.patch('globalwis.management.commands.refresh_news.refresh_news', refresh), \
+                mock.patch('globalwis.management.commands.refresh_news.time.sleep', side_effect=[None, Stop]), \
+                self.assertLogs('globalwis.management.commands.refresh_news', 'ERROR'):
+            with self.assertRaises(Stop):
+                call_command('refresh_news', loop=True, stdout=io.StringIO())
+        self.assertEqual(refresh.call_count, 2)
+
+
+class OutboundTests(SimpleTestCase):
+    def fake_get(self, url, **kwargs):
+        if url.endswith('/fail'):
+            raise ConnectionError(url)
+        return url
+
+    def test_get_many_keeps_order_and_exceptions(self):
+        with mock.patch('globalwis.outbound.get', side_effect=self.fake_get):
+            results = outbound.get_many([('https://a/1', {}), ('https://a/fail', {}), ('https://a/3', {})])
+        self.assertEqual(results[0], 'https://a/1')
+        self.assertIsInstance(results[1], ConnectionError)
+        self.assertEqual(results[2], 'https://a/3')
+        self.assertIs(outbound.get_executor(), outbound.get_executor())
+
+    async def test_get_many_inside_a_running_loop(self):
+        with mock.patch('globalwis.outbound.get', side_effect=self.fake_get):
+            self.assertEqual(outbound.get_many([('https://a/1', {}), ('https://a/2', {})]), ['https://a/1', 'https://a/2'])
+            self.assertEqual(await outbound.aget('https://a/3'), 'https://a/3')
+
+
+class QuoteTests(TestCase):
+    def test_price_check_stores_only_the_quote(self):
+        LocationDistance.objects.create(pickup_country='US', delivery_country='GB', distance_km=5500)
+        user = User.objects.create_user('quote')
+        self.client.force_login(user)
+        response = self.client.post(reverse('quote'), {
+            'pickup_country': 'US', 'pickup_zip': 10001, 'delivery_country': 'GB', 'delivery_zip': 1,
+            'weight': 2, 'length': 10, 'width': 10, 'height': 10,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Quote.objects.filter(sender=user).count(), 1)
+        self.assertFalse(Package.objects.filter(sender=user).exists())
+
+
+def stats_snapshot():
+    fields = ['packages', 'shipments', *UserShipmentStats.STATUS_COLUMNS.values(), 'other_status', 'total_weight', 'total_spend', 'last_shipment_at']
+    return {row['user_id']: row for row in UserShipmentStats.objects.values('user_id', *fields)}
+
+
+def location_snapshot():
+    rows = PackageCountByLocation.objects.exclude(count=0).values_list('country', 'station_id', 'count')
+    return sorted(rows, key=str)
+
+
+class AggregateTestMixin:
+    def setUp(self):
+        self.user = User.objects.create_user('sender')
+        self.other = User.objects.create_user('other')
+        quote = Quote.objects.create(
+            sender=self.user, pickup_country='US', delivery_country='GB', weight=2, length=10, width=10, height=10,
+            price=Decimal('10.40'), expires_at=timezone.now(),
+        )
+        self.package = Package.objects.create(sender=self.user, weight=Decimal('2.00'), package_id='GBWAGG1', quote=quote)
+        self.spare = Package.objects.create(sender=self.user, weight=Decimal('1.25'))
+        Package.objects.create(sender=self.other, weight=Decimal('3.00'))
+        self.payment = Payment.objects.create(
+            cardholder_name='Ann', card_number='4111', card_type='debit_card', card_brand='visa',
+            card_expiry_month=1, card_expiry_year=2030, fingerprint='f' * 64,
+        )
+        self.stations = [
+            Stations.objects.create(name=name, address='1 St', agent_name='Agent', agent_contact='555')
+            for name in ('North', 'South')
+        ]
+
+    def assertMatchesRebuild(self):
+        raise NotImplementedError
+
+    def run_lifecycle(self):
+        # create -> pay -> status changes -> move -> cancel -> delete
+        shipment = Shipment.objects.create(package=self.package, status=ShipmentEvent.PENDING, origin='United States of America', drop_off_location=self.stations[0])
+        self.assertMatchesRebuild()
+        shipment.payment = self.payment
+        shipment.save()
+        self.assertMatchesRebuild()
+        shipment.record_event(ShipmentEvent.SUCCESSFUL)
+        shipment.record_event(ShipmentEvent.IN_TRANSIT)
+        self.assertMatchesRebuild()
+        shipment = Shipment.objects.get(pk=shipment.pk)
+        shipment.origin = 'Canada'
+        shipment.drop_off_location = self.stations[1]
+        shipment.save()
+        self.assertMatchesRebuild()
+        extra = Shipment.objects.create(package=self.spare, status=ShipmentEvent.PENDING, origin='Canada', drop_off_location=self.stations[1])
+        self.assertMatchesRebuild()
+        shipment.record_event(ShipmentEvent.CANCELED)
+        self.assertMatchesRebuild()
+        extra.delete()
+        self.assertMatchesRebuild()
+        self.spare.weight = Decimal('4.50')
+        self.spare.save()
+        self.assertMatchesRebuild()
+        self.package.delete()  # cascades to the canceled shipment
+        self.assertMatchesRebuild()
+
+
+class UserShipmentStatsTests(AggregateTestMixin, TestCase):
+    def assertMatchesRebuild(self):
+        incremental = stats_snapshot()
+        stats.rebuild_stats()
+        self.assertEqual(incremental, stats_snapshot())
+
+    def test_incremental_stats_match_rebuild(self):
+        self.run_lifecycle()
+        self.assertEqual(stats_snapshot()[self.user.pk]['total_weight'], Decimal('4.50'))
+
+
+class PackageCountByLocationTests(AggregateTestMixin, TestCase):
+    def assertMatchesRebuild(self):
+        incremental = location_snapshot()
+        stats.rebuild_location_counts()
+        self.assertEqual(incremental, location_snapshot())
+
+    def test_incremental_counts_match_rebuild(self):
+        self.run_lifecycle()
+
+    def test_move_and_cancel(self):
+        shipment = Shipment.objects.create(package=self.package, status=ShipmentEvent.PENDING, origin='United States of America', drop_off_location=self.stations[0])
+        shipment = Shipment.objects.get(pk=shipment.pk)
+        shipment.origin = 'Canada'
+        shipment.drop_off_location = self.stations[1]
+        shipment.save()
+        self.assertEqual(location_snapshot(), sorted([('Canada', None, 1), (None, self.stations[1].pk, 1)], key=str))
+        shipment.record_event(ShipmentEvent.CANCELED)
+        self.assertEqual(location_snapshot(), [])
+
+
+class ShipmentReportTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('reports', 'r@x.com', 'pw'))
+        package = Package.objects.create(sender=User.objects.create_user('shipper'), weight=1, package_id='GBWREPORT')
+        self.shipments = [
+            Shipment.objects.create(package=package, status=status, origin=origin, destination='Canada')
+            for status, origin in [
+                (ShipmentEvent.PENDING, 'Mexico'),
+                (ShipmentEvent.DELIVERED, 'Mexico'),
+                (ShipmentEvent.DELIVERED, 'Peru'),
+                (ShipmentEvent.DELIVERED, 'Mexico'),
+            ]
+        ]
+        Shipment.objects.filter(pk=self.shipments[0].pk).update(date=timezone.make_aware(datetime(2024, 1, 1)))
+
+    def get(self, **params):
+        return self.client.get(reverse('shipment_report'), params)
+
+    def test_filters(self):
+        response = self.get(format='jsonl', status=ShipmentEvent.DELIVERED, origin='Mexico')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.shipments[1].pk, self.shipments[3].pk])
+        self.assertEqual(rows[0]['package_id'], 'GBWREPORT')
+
+        response = self.get(date_from='2023-12-31', date_to='2024-01-01')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(','), list(admin.REPORT_COLUMNS))
+        self.assertEqual([int(line.split(',')[0]) for line in lines[1:]], [self.shipments[0].pk])
+
+        self.assertEqual(self.get(date_from='yesterday').status_code, 400)
+        self.assertEqual(self.get(format='xml').status_code, 400)
+
+    @override_settings(REPORT_CHUNK_SIZE=1000)
+    def test_first_row_is_sent_before_the_rest_is_read(self):
+        for output in ('csv', 'jsonl'):
+            with self.subTest(output=output):
+                chunks = iter(self.get(format=output).streaming_content)
+                if output == 'csv':
+                    self.assertTrue(next(chunks).startswith(b'id,package_id'))
+                with self.assertNumQueries(1):
+                    first = next(chunks)
+                self.assertEqual(len(first.splitlines()), 1)
+                self.assertIn(str(self.shipments[0].pk).encode(), first)
+                self.assertEqual(len(b''.join(chunks).splitlines()), 3)
+
+    def test_staff_only(self):
+        self.client.force_login(User.objects.create_user('nosy'))
+        self.assertEqual(self.get().status_code, 302)
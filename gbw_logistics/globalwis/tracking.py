@@ -0,0 +1,90 @@
+from .models import Package, Shipment
+
+
+# Everything the tracking pages show, fetched with the shipment in one join
+TRACKING_RELATED = ('package', 'contact_info', 'drop_off_location', 'pick_up_location', 'latest_event')
+
+
+def get_tracking(package_id):
+    # Returns (package, shipment), shipment being None when the package has
+    # not been shipped yet. Raises Package.DoesNotExist for unknown IDs.
+    shipment = (
+        Shipment.objects.select_related(*TRACKING_RELATED)
+        .filter(package__package_id=package_id)
+        .order_by('-pk')
+        .first()
+    )
+    if shipment is not None:
+        return shipment.package, shipment
+    return Package.objects.get(package_id=package_id), None
+
+
+def get_last_modified(package_id):
+    # Cheap check for conditional requests: one indexed lookup, no joins loaded
+    return (
+        Shipment.objects.filter(package__package_id=package_id)
+        .order_by('-pk')
+        .values_list('updated_at', flat=True)
+        .first()
+    )
+
+
+def _text(value):
+    # Several CharFields are declared with default=False and hold 'False'
+    if value in (None, '', 'False'):
+        return None
+    return value
+
+
+def tracking_payload(package, shipment):
+    # Public view of a shipment, nothing personal in here
+    data = {
+        'package_id': package.package_id,
+        'status': None,
+        'origin': _text(package.pickup_country),
+        'destination': _text(package.delivery_country),
+        'current_location': None,
+        'shipped_at': None,
+        'updated_at': None,
+    }
+    if shipment is not None:
+        data.update({
+            'status': shipment.status,
+            'origin': _text(shipment.origin) or data['origin'],
+            'destination': _text(shipment.destination) or data['destination'],
+            'current_location': {
+                'state': shipment.current_state,
+                'country': shipment.current_country,
+                'zip': shipment.current_zip,
+            },
+            'shipped_at': shipment.date.isoformat(),
+            'updated_at': shipment.updated_at.isoformat(),
+        })
+    return data
+
+
+BATCH_FIELDS = (
+    'package_id', 'pickup_country', 'delivery_country',
+    'shipment__id', 'shipment__status', 'shipment__origin', 'shipment__destination',
+    'shipment__current_state', 'shipment__current_country', 'shipment__current_zip',
+    'shipment__updated_at',
+)
+
+
+def get_tracking_batch(package_ids):
+    # Resolves many package IDs with one IN query (packages LEFT JOIN
+    # shipments). Returns ({package_id: status dict}, [missing ids]).
+    rows = Package.objects.filter(package_id__in=package_ids).values(*BATCH_FIELDS).order_by('shipment__id')
+    results = {}
+    for row in rows:
+        # Ordered by shipment id, so the latest shipment of a package wins
+        results[row['package_id']] = {
+            'status': row['shipment__status'],
+            'origin': _text(row['shipment__origin']) or _text(row['pickup_country']),
+            'destination': _text(row['shipment__destination']) or _text(row['delivery_country']),
+            'location': [row['shipment__current_state'], row['shipment__current_country'], row['shipment__current_zip']]
+                        if row['shipment__id'] else None,
+            'updated_at': row['shipment__updated_at'].isoformat() if row['shipment__updated_at'] else None,
+        }
+    missing = [package_id for package_id in package_ids if package_id not in results]
+    return results, missing
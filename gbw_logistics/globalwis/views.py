@@ -1,8 +1,11 @@
 # Imports
 import os
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponseRedirect, HttpResponseNotFound
-import requests
+from django.http import Http404, HttpResponse, HttpResponseRedirect, HttpResponseNotFound, FileResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST, require_safe, require_http_methods, condition
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.cache import cache_control
+from django.core.handlers.asgi import ASGIRequest
 from django.views.generic import CreateView, UpdateView, DetailView, ListView, FormView, TemplateView, View
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from math import radians, cos, sin, asin, sqrt
@@ -10,16 +13,33 @@ from django.urls import reverse_lazy, reverse
 from django.contrib import messages
 import googlemaps
 from django.conf import settings
+from django.utils import timezone
 from googlemaps.exceptions import ApiError
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.models import User
-from .models import Package, Location, LocationDistance, Shipment, Checkout, Packaging, Contact, Payment
+from .models import Package, Location, Quote, NewsArticle, Shipment, ShipmentEvent, UserShipmentStats, PackageCountByLocation, Checkout, Packaging, Contact
 from .forms import PackageForm, LocationForm, QuoteForm, CheckoutForm, ShipmentForm, PackagingForm, ShipmentTrackingForm, ContactForm, EditShipmentForm, EditShippingForm, PaymentForm, ImageUploadForm
 import django_countries
-from django_countries import countries
-from geopy import distance
 from opencage.geocoder import OpenCageGeocode
-import uuid
+from asgiref.sync import sync_to_async
+from .geocoding import get_stats as get_geocode_stats
+from .news import feed_state
+from .broker import get_broker
+from .tracking import get_tracking, get_last_modified, get_tracking_batch, tracking_payload
+from .distances import calculate_distance, offline_distance
+from .identity import identity_map
+from .images import resolve as resolve_image, schedule_variants, store_upload
+from .drafts import STEPS as DRAFT_STEPS, commit_draft, form_data, get_draft, missing_step, save_step, start_draft
+from .pagination import keyset_page
+from .projections import project, PackageRow, ShipmentListRow, LocationRow
+from .pricing import InvalidPackage, get_rate_card, price_packages, quote_price, cents_to_decimal
+import csv
+from datetime import timedelta
+import io
+import json
+import math
+import time
 import stripe
 from django.contrib import messages
 from django.core.mail import send_mail
@@ -42,37 +62,10 @@ class HomeView(FormView):
             return self.form_invalid(form)
 
 
-def get_geocode(address, api_key):
-    url = "https://api.opencagedata.com/geocode/v1/json?q={}&key={}".format(address, api_key)
-    response = requests.get(url).json()
-    if response['total_results'] > 0:
-        lat = response['results'][0]['geometry']['lat']
-        lng = response['results'][0]['geometry']['lng']
-        return lat, lng
-    else:
-        return None, None
-
-def calculate_distance(pickup_country, pickup_lat, pickup_lng, delivery_country, delivery_lat, delivery_lng, api_key):
-    url = "https://api.opencagedata.com/geocode/v1/json"
-    params_pickup = {"q": pickup_country, "key": api_key}
-    print(f" Pickup country: {pickup_country}")
-    params_delivery = {"q": delivery_country, "key": api_key}
-    print(f" Delivery country: {delivery_country}")
-    response_pickup = requests.get(url, params=params_pickup).json()
-    response_delivery = requests.get(url, params=params_delivery).json()
-    distance_km = distance.distance((pickup_lat, pickup_lng), (delivery_lat, delivery_lng)).km
-
-    # Save distance to the database
-    distance_obj, created = LocationDistance.objects.get_or_create(
-        pickup_country=pickup_country,
-        delivery_country=delivery_country,
-        defaults={"distance_km": distance_km},
-    )
-    if not created:
-        distance_obj.distance_km = distance_km
-        distance_obj.save()
-
-    return distance_km
+@staff_member_required
+def geocode_stats(request):
+    # Per-process counters, lets us check the quote path stops reaching OpenCage
+    return JsonResponse(get_geocode_stats())
 
 class TrackQuoteView(TemplateView):
     template_name = 'trackquote.html'
@@ -113,99 +106,75 @@ class QuotesCreateView(LoginRequiredMixin, CreateView):
         elif "quote" in url:
             return "/swiftdrop/show-price"
 
-    # Define the constants for weight, volume and conversion rate
-    WEIGHT_RATE = 10.0  # $10 per kg
-    VOLUME_RATE = 0.2  # $0.2 per cubic meter
-    VOLUMETRIC_WEIGHT_FACTOR = 5000  # Conversion rate for volumetric weight
-
-
     def form_valid(self, form):
         print(f"User: {self.request.user}")
         form.instance.sender = self.request.user
-        pickup_country = form.cleaned_data["pickup_country"]
-        delivery_country = form.cleaned_data["delivery_country"]
-        pickup_zip = form.cleaned_data["pickup_zip"]
-        delivery_zip = form.cleaned_data["delivery_zip"]
-        weight = form.cleaned_data["weight"]
-        length = form.cleaned_data.get("length")
-        width = form.cleaned_data.get("width")
-        height = form.cleaned_data.get("height")
-        api_key = settings.MY_API_KEY
-        print(f"api_key={api_key}")
-        pickup_lat, pickup_lng = get_geocode(pickup_country, api_key)
-        delivery_lat, delivery_lng = get_geocode(delivery_country, api_key)
-        
-        # Calculate the price based on weight and dimensions
-        if pickup_country and delivery_country:
-            pickup_country_name = countries.name(pickup_country)
-            delivery_country_name = countries.name(delivery_country)
-            print(f" Pickup country name: {pickup_country_name}")
-            print(f" Delivery country name: {delivery_country_name}")
-            # Calculate the price based on weight and dimensions
-            base_price = weight * ((height * width * length) / 5000)
-            # Calculate the distance between the pickup and delivery locations
-            pickup_lat, pickup_lng = get_geocode(pickup_country, api_key)
-            delivery_lat, delivery_lng = get_geocode(delivery_country, api_key)
-            if pickup_lat and pickup_lng and delivery_lat and delivery_lng:
-                distance = calculate_distance(pickup_country, pickup_lat, pickup_lng, delivery_country, delivery_lat, delivery_lng, api_key)
-                # Calculate the Travel Duration
-                speed_time = distance / 800 # Average flight speed for cargo planes is 800 km/hour
-                form.instance.speed_time = speed_time
-                # Calculate the distance-based cost
-                rate_per_km = 0.1 # Replace with your own rate per kilometer
-                distance_price = distance * rate_per_km
-
-                # Add the distance-based cost to the base cost
-                price = base_price + distance_price
-            else:
-                # If geocoding fails, use the base cost as the price
-                price = base_price
+        try:
+            quote = self.get_or_create_quote(form.cleaned_data)
+        except InvalidPackage as e:
+            form.add_error(e.field if e.field in form.fields else None, str(e))
+            return self.form_invalid(form)
 
-            # Save the calculated price and distance in the form instance
-            form.instance.price = price
-            form.instance.distance = distance if 'distance' in locals() else None
-        else:
-            # If the pickup and delivery countries are not provided, use the base cost as the price
-            price = weight * ((height * width * length) / 5000)
-            form.instance.price = price
+        # Save the calculated price and distance in the form instance
+        form.instance.price = quote.price
+        form.instance.distance = quote.distance_km
+        form.instance.speed_time = quote.speed_time
 
-        # Save the form
-        self.object = form.save()
         url = self.request.build_absolute_uri()
-        package = None
         if "create_shipment" in url:
-            # create a new package instance
-            package = Package.objects.create(
-                sender=self.request.user,
-                pickup_country=pickup_country_name,
-                delivery_country=delivery_country_name,
-                weight=form.cleaned_data['weight'],
-                height=form.cleaned_data['height'],
-                width=form.cleaned_data['width'],
-                length=form.cleaned_data['length']
-            )
-
-            # generate a unique package ID
-            package_id = 'gbw' + uuid.uuid4().hex[:8]
-            print(f"Package ID: {package_id}")
-
-            # set the package_id field for the package instance
-            package.package_id = package_id
-            package.save()
-            self.request.session['package_id'] = package.package_id
-
-            checkout = Checkout.objects.create(
-                sender_pickup_country=pickup_country_name,
-                sender_pickup_zip=pickup_zip,
-                receiver_delivery_country=delivery_country_name,
-                receiver_delivery_zip=delivery_zip,
-                package=package,
-            )
-            checkout.save()
-
-        # Redirect to the show_price view with the price and distance as parameters
-        return HttpResponseRedirect(self.get_success_url() + f'?price={price}&distance={distance}&pickup_country={pickup_country_name}&delivery_country={delivery_country_name}&pickup_zip={pickup_zip}&delivery_zip={delivery_zip}&speed_time={speed_time}&package={package}')
-    
+            # Nothing is written until the payment step, the wizard starts a
+            # draft. A plain price check stores nothing but the Quote.
+            start_draft(self.request, {
+                'quote_id': quote.pk,
+                'pickup_country': quote.pickup_country_name,
+                'pickup_zip': form.cleaned_data['pickup_zip'],
+                'delivery_country': quote.delivery_country_name,
+                'delivery_zip': form.cleaned_data['delivery_zip'],
+                'weight': form.cleaned_data['weight'],
+                'height': form.cleaned_data['height'],
+                'width': form.cleaned_data['width'],
+                'length': form.cleaned_data['length'],
+            })
+
+        # Redirect to the show_price / checkout view with the stored quote
+        self.request.session['quote_id'] = quote.pk
+        return HttpResponseRedirect(self.get_success_url() + f'?quote={quote.pk}')
+
+    def get_or_create_quote(self, data):
+        lookup = {
+            'sender': self.request.user,
+            'pickup_country': data['pickup_country'],
+            'pickup_zip': str(data['pickup_zip'] or ''),
+            'delivery_country': data['delivery_country'],
+            'delivery_zip': str(data['delivery_zip'] or ''),
+            'weight': data['weight'],
+            'length': data['length'],
+            'width': data['width'],
+            'height': data['height'],
+        }
+        # Going back and resubmitting the same form reuses the stored quote
+        quote = Quote.objects.filter(expires_at__gt=timezone.now(), **lookup).order_by('-created_at').first()
+        if quote is not None:
+            return quote
+
+        # Look up the distance between the pickup and delivery locations
+        distance = calculate_distance(data['pickup_country'], data['delivery_country'], settings.MY_API_KEY, data['pickup_zip'], data['delivery_zip'])
+        speed_time = None
+        if distance is not None:
+            # Calculate the Travel Duration
+            speed_time = distance / 800 # Average flight speed for cargo planes is 800 km/hour
+
+        # Price from weight and dimensions, plus the distance-based cost when the distance is known
+        price = quote_price(data['weight'], data['length'], data['width'], data['height'], distance)
+
+        return Quote.objects.create(
+            price=price,
+            distance_km=distance,
+            speed_time=speed_time,
+            expires_at=timezone.now() + timedelta(seconds=settings.QUOTE_TTL),
+            **lookup,
+        )
+
 
     def get_form(self, form_class=None):
         if form_class is None:
@@ -233,31 +202,107 @@ class QuotesCreateView(LoginRequiredMixin, CreateView):
         context["flag"] = "flag"
         return context
 
+def get_user_quote(request):
+    # The quote being worked on, from ?quote= or the session; None if missing or expired
+    try:
+        quote_id = int(request.GET.get('quote') or request.session.get('quote_id'))
+    except (ValueError, TypeError):
+        return None
+    quote = Quote.objects.filter(pk=quote_id, sender=request.user).first()
+    if quote is None or quote.is_expired:
+        return None
+    return quote
+
 @login_required
 def show_price(request):
-    price = request.GET.get('price')
-    distance = request.GET.get('distance')
-    pickup_country = request.GET.get('pickup_country')
-    delivery_country = request.GET.get('delivery_country')
-    pickup_zip = request.GET.get('pickup_zip')
-    delivery_zip = request.GET.get('delivery_zip')
-    speed_time = request.GET.get('speed_time')
-    package = request.GET.get('package')
-
+    quote = get_user_quote(request)
+    if quote is None:
+        messages.info(request, 'Your quote has expired, please request a new one.')
+        return redirect('quote')
 
     context = {
-        'price': price,
-        'distance': distance,
-        'pickup_country': pickup_country,
-        'pickup_zip': pickup_zip,
-        'speed_time': speed_time,
-        'delivery_country': delivery_country,
-        'delivery_zip': delivery_zip,
-        'package': package,
+        'quote': quote,
+        'price': quote.price,
+        'distance': quote.distance_km,
+        'pickup_country': quote.pickup_country_name,
+        'pickup_zip': quote.pickup_zip,
+        'speed_time': quote.speed_time,
+        'delivery_country': quote.delivery_country_name,
+        'delivery_zip': quote.delivery_zip,
     }
     return render(request, 'show_price.html', context)
 
 
+def read_bulk_packages(request):
+    # Accepts a CSV body or a JSON list of packages (optionally wrapped as
+    # {"rate_card": ..., "packages": [...]}). Answers in the same format.
+    rate_card = request.GET.get('rate_card')
+    if request.content_type == 'text/csv':
+        rows = list(csv.DictReader(io.StringIO(request.body.decode('utf-8'))))
+        return rows, rate_card, 'csv'
+    if request.content_type == 'application/json':
+        data = json.loads(request.body)
+        if isinstance(data, dict):
+            rate_card = data.get('rate_card', rate_card)
+            data = data.get('packages', [])
+        if not isinstance(data, list):
+            raise ValueError('Expected a list of packages')
+        return data, rate_card, 'json'
+    raise ValueError('Send packages as text/csv or application/json')
+
+
+def stream_bulk_quotes(rows, distances, cents, output, chunk_size=500):
+    fields = ['reference', 'pickup_country', 'delivery_country', 'distance_km', 'price', 'price_cents']
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if output == 'csv':
+        writer.writerow(fields)
+
+    for i, row in enumerate(rows):
+        distance_km = None if math.isnan(distances[i]) else round(float(distances[i]), 1)
+        result = [row.get('reference') or i, row['pickup_country'], row['delivery_country'], distance_km, str(cents_to_decimal(cents[i])), int(cents[i])]
+        if output == 'csv':
+            writer.writerow(result)
+        else:
+            buffer.write(json.dumps(dict(zip(fields, result))) + '\n')
+        if (i + 1) % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+@login_required
+@require_POST
+def bulk_quote(request):
+    try:
+        rows, rate_card_name, output = read_bulk_packages(request)
+        if len(rows) > settings.BULK_QUOTE_MAX_PACKAGES:
+            raise ValueError(f'At most {settings.BULK_QUOTE_MAX_PACKAGES} packages per request')
+        rate_card = get_rate_card(rate_card_name)
+        distances = []
+        for row in rows:
+            distance_km = offline_distance(row['pickup_country'], row['delivery_country'], row.get('pickup_zip'), row.get('delivery_zip'))
+            distances.append(math.nan if distance_km is None else distance_km)
+        cents = price_packages(
+            [row['weight'] for row in rows],
+            [row['length'] for row in rows],
+            [row['width'] for row in rows],
+            [row['height'] for row in rows],
+            distances,
+            rate_card,
+        )
+    except KeyError as e:
+        return JsonResponse({'error': f'Missing field {e}'}, status=400)
+    except InvalidPackage as e:
+        return JsonResponse({'error': str(e), 'row': e.row, 'reference': rows[e.row].get('reference')}, status=400)
+    except (ValueError, TypeError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    content_type = 'text/csv' if output == 'csv' else 'application/x-ndjson'
+    return StreamingHttpResponse(stream_bulk_quotes(rows, distances, cents, output), content_type=content_type)
+
+
 class CheckoutView(LoginRequiredMixin, FormView):
     form_class = CheckoutForm
     template_name = 'checkout.html'
@@ -268,15 +313,16 @@ class CheckoutView(LoginRequiredMixin, FormView):
         initial = super().get_initial()
 
         # Set initial values for form fields
-        initial['pickup_country'] = self.request.GET.get('pickup_country')
-        initial['pickup_zip'] = self.request.GET.get('pickup_zip')
-        initial['delivery_country'] = self.request.GET.get('delivery_country')
-        initial['delivery_zip'] = self.request.GET.get('delivery_zip')
+        quote = self.get_quote()
+        if quote is not None:
+            initial['pickup_country'] = quote.pickup_country_name
+            initial['pickup_zip'] = quote.pickup_zip
+            initial['delivery_country'] = quote.delivery_country_name
+            initial['delivery_zip'] = quote.delivery_zip
 
         # Get the contact object for the current user
-        try:
-            contact = Contact.objects.get(user=self.request.user)
-        except Contact.DoesNotExist:
+        contact = identity_map(self.request).get(Contact, user=self.request.user)
+        if contact is None:
             # No contact object exists, return empty initial dictionary
             return initial
 
@@ -301,120 +347,30 @@ class CheckoutView(LoginRequiredMixin, FormView):
         kwargs['request'] = self.request
         return kwargs
 
+    def get_quote(self):
+        if not hasattr(self, '_quote'):
+            self._quote = get_user_quote(self.request)
+        return self._quote
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['pickup_country'] = self.request.GET.get('pickup_country')
-        context['pickup_zip'] = self.request.GET.get('pickup_zip')
-        context['delivery_country'] = self.request.GET.get('delivery_country')
-        context['delivery_zip'] = self.request.GET.get('delivery_zip')
+        quote = self.get_quote()
+        context['quote'] = quote
+        if quote is not None:
+            context['pickup_country'] = quote.pickup_country_name
+            context['pickup_zip'] = quote.pickup_zip
+            context['delivery_country'] = quote.delivery_country_name
+            context['delivery_zip'] = quote.delivery_zip
         return context
 
     def form_valid(self, form):
-        # Get the package ID from the session
-        package_id = self.request.session.get('package_id')
-        pickup_country = self.request.GET.get('pickup_country')
-        if package_id is None:
+        # The draft was loaded by CheckoutForm.clean through the identity map.
+        # The checkout and contact are written with the rest of the shipment
+        # at the payment step.
+        draft = form.cleaned_data.get('draft')
+        if draft is None or 'package' not in draft.data:
             return HttpResponseRedirect(reverse('create_shipment'))
-
-        try:
-            package = Package.objects.get(package_id=package_id)
-        except Package.DoesNotExist:
-            return HttpResponseRedirect(reverse('create_shipment'))
-
-        # Get form data
-        sender_name = form.cleaned_data['sender_name']
-        sender_company = form.cleaned_data['sender_company']
-        sender_address = form.cleaned_data['sender_address']
-        sender_address2 = form.cleaned_data['sender_address2']
-        sender_address3 = form.cleaned_data['sender_address3']
-        sender_city = form.cleaned_data['sender_city']
-        sender_state = form.cleaned_data['sender_state']
-        sender_email = form.cleaned_data['sender_email']
-        sender_phone_type = form.cleaned_data['sender_phone_type']
-        sender_phone_code = form.cleaned_data['sender_phone_code']
-        sender_phone_number = form.cleaned_data['sender_phone_number']
-        receiver_name = form.cleaned_data['receiver_name']
-        receiver_company = form.cleaned_data['receiver_company']
-        receiver_address = form.cleaned_data['receiver_address']
-        receiver_address2 = form.cleaned_data['receiver_address2']
-        receiver_address3 = form.cleaned_data['receiver_address3']
-        receiver_city = form.cleaned_data['receiver_city']
-        receiver_state = form.cleaned_data['receiver_state']
-        receiver_email = form.cleaned_data['receiver_email']
-        receiver_phone_type = form.cleaned_data['receiver_phone_type']
-        receiver_phone_code = form.cleaned_data['receiver_phone_code']
-        receiver_phone_number = form.cleaned_data['receiver_phone_number']
-        vat_tax_id = form.cleaned_data['vat_tax_id']
-        
-        # Get the checkout object for the current user
-        package = Package.objects.get(package_id=package_id)
-        checkout = get_object_or_404(Checkout, package=package)
-
-        # Update the fields
-        checkout.sender_name = sender_name
-        checkout.sender_company = sender_company
-        checkout.sender_address = sender_address
-        checkout.sender_address2 = sender_address2
-        checkout.sender_address3 = sender_address3
-        checkout.sender_city = sender_city
-        checkout.sender_state = sender_state
-        checkout.sender_email = sender_email
-        checkout.sender_phone_type = sender_phone_type
-        checkout.sender_phone_code = sender_phone_code
-        checkout.sender_phone_number = sender_phone_number
-        checkout.receiver_name = receiver_name
-        checkout.receiver_company = receiver_company
-        checkout.receiver_address = receiver_address
-        checkout.receiver_address2 = receiver_address2
-        checkout.receiver_address3 = receiver_address3
-        checkout.receiver_city = receiver_city
-        checkout.receiver_state = receiver_state
-        checkout.receiver_email = receiver_email
-        checkout.receiver_phone_type = receiver_phone_type
-        checkout.receiver_phone_code = receiver_phone_code
-        checkout.receiver_phone_number = receiver_phone_number
-        checkout.vat_tax_id = vat_tax_id
-
-        # Save the updated object
-        checkout.save()
-        
-        # Get or create the contact object
-        contact, created = Contact.objects.get_or_create(user=self.request.user, name=sender_name)
-
-        # Update the fields
-        contact.company = sender_company
-        contact.country = ""  # Add the sender's country
-        contact.address = sender_address
-        contact.address2 = sender_address2
-        contact.address3 = sender_address3
-        contact.zip_code = None  # Add the sender's zip code
-        contact.city = sender_city
-        contact.state = sender_state
-        contact.email = sender_email
-        contact.phone_type = sender_phone_type
-        contact.phone_country_code = sender_phone_code
-        contact.phone_number = sender_phone_number
-
-        # Save the updated object
-        contact.save()
-
-       
-
-        # Access submitted form data through cleaned_data
-        sender_pickup_country = form.cleaned_data['sender_pickup_country']
-        sender_pickup_zip = form.cleaned_data['sender_pickup_zip']
-        receiver_delivery_country = form.cleaned_data['receiver_delivery_country']
-        receiver_delivery_zip = form.cleaned_data['receiver_delivery_zip']
-
-
-        pickup_country = checkout.sender_pickup_country
-        delivery_country = checkout.receiver_delivery_country
-        pickup_zip = checkout.sender_pickup_zip
-        delivery_zip = checkout.receiver_delivery_zip
-        print(f"Checkout Package pickup: {pickup_country}")
-        
-        # ...
-        success_url = f"{self.success_url}?package_id={package_id}&pickup_country={pickup_country}&delivery_country={delivery_country}&pickup_zip={pickup_zip}&delivery_zip={delivery_zip}"
+        save_step(draft, 'checkout', form_data(form))
         return HttpResponseRedirect(self.success_url)
 
     def post(self, request, *args, **kwargs):
@@ -511,7 +467,9 @@ class UserDashboardView(LoginRequiredMixin, TemplateView):
         context = super().get_context_data(**kwargs)
         user = self.request.user
         # Retrieve user's shipments and add them to the context dictionary
-        context['shipments'] = Package.objects.filter(sender=user)
+        context['shipments'] = project(Package.objects.filter(sender=user), PackageRow)
+        # Summary header, one primary key read of the precomputed row
+        context['stats'] = UserShipmentStats.objects.filter(pk=user.pk).first() or UserShipmentStats(user=user)
         context['manage_shipments_url'] = "#"
         context['create_shipments_url'] = "#"
         context['profile_url'] = "#"
@@ -521,42 +479,20 @@ class UserDashboardView(LoginRequiredMixin, TemplateView):
 class ShipmentDetailsView(LoginRequiredMixin, FormView):
     template_name = 'shipment_details.html'
     form_class = ShipmentForm
-    success_url = reverse_lazy('image_upload', kwargs={'shipment_id': None})
-    
+    success_url = reverse_lazy('image_upload')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Price and ETA come from the stored quote, nothing is recomputed here
+        context['quote'] = get_user_quote(self.request)
+        return context
+
     def form_valid(self, form):
-        # save the form data to your database
-        package_id = self.request.session.get('package_id')
-        pickup_country = self.request.session.get('pickup_country')
-        delivery_country = self.request.session.get('delivery_country')
-        package = Package.objects.get(package_id=package_id)
-        
-        print(f"Shipment Package ID: {package_id}")
-        
-        checkout = get_object_or_404(Checkout, package=package)
-        pickup_country = checkout.sender_pickup_country
-        delivery_country = checkout.receiver_delivery_country
-        
-        print(f"Shipment Package pickup: {pickup_country}")
-        print(f"Shipment Package delivery: {delivery_country}")
-        # count the number of unassigned packages
-        package_count = Package.objects.all().count()
-        unassigned_count = Package.objects.filter(package_id=None).count()
-        print(f"{unassigned_count} unassigned packages found out of {package_count} total packages")
-        # Delete Unassigned Packages
-        unassigned_packages = Package.objects.filter(package_id=None)
-        unassigned_packages.delete()
-
-        shipment = form.save(commit=False)  # don't save the form yet
-        # set the status of the shipment
-        shipment.status = 'Pending'
-        shipment.origin = checkout.sender_pickup_country
-        shipment.destination = checkout.receiver_delivery_country
-        shipment.weight = package.weight
-        shipment.package = package  # assign the package object
-        shipment.contact_info = checkout  # assign the checkout object
-        shipment.save()  # Now save the Shipment object to the database
-        # redirect to the shipment confirmation page
-        self.success_url = reverse_lazy('image_upload', kwargs={'shipment_id': shipment.pk})
+        draft = get_draft(self.request)
+        step = missing_step(draft, 'shipment')
+        if step is not None:
+            return redirect(step)
+        save_step(draft, 'shipment', form_data(form))
         return super().form_valid(form)
 
     def post(self, request, *args, **kwargs):
@@ -572,68 +508,81 @@ class ShipmentDetailsView(LoginRequiredMixin, FormView):
 
 class ImageUploadView(LoginRequiredMixin, View):
     template_name = 'image_upload.html'
-    
-    def get_success_url(self, shipment_id):
-        return reverse_lazy('packaging', kwargs={'shipment_id': shipment_id})
-    
+    success_url = reverse_lazy('packaging')
+
     def get(self, request, *args, **kwargs):
-        shipment_id = self.kwargs.get('shipment_id')
-        shipment = Shipment.objects.filter(pk=shipment_id).first()
+        draft = get_draft(request)
+        step = missing_step(draft, 'image')
+        if step is not None:
+            return redirect(step)
         form = ImageUploadForm()
         context = {
-            'shipment': shipment,
+            'draft': draft,
             'form': form
         }
         return render(request, self.template_name, context)
-    
+
     def post(self, request, *args, **kwargs):
-        shipment_id = self.kwargs.get('shipment_id')
-        shipment = Shipment.objects.filter(pk=shipment_id).first()
+        draft = get_draft(request)
+        step = missing_step(draft, 'image')
+        if step is not None:
+            return redirect(step)
         form = ImageUploadForm(request.POST, request.FILES)
         if form.is_valid():
-            image = form.cleaned_data['image']
-            # Save the image to the static directory
-            with open(os.path.join(settings.BASE_DIR, 'static', 'images', image.name), 'wb+') as destination:
-                for chunk in image.chunks():
-                    destination.write(chunk)
-            # Update the shipment object with the image URL
-            shipment.image = f'/static/images/{image.name}'
-            shipment.save()
-            return redirect(self.get_success_url(shipment_id))
+            try:
+                name = store_upload(form.cleaned_data['image'])
+            except ValueError as e:
+                form.add_error('image', str(e))
+            else:
+                # Thumbnails are made in the background, the shipment gets
+                # the stored name when the draft is committed
+                schedule_variants(name)
+                save_step(draft, 'image', name)
+                return redirect(self.success_url)
         context = {
-            'shipment': shipment,
+            'draft': draft,
             'form': form
         }
         return render(request, self.template_name, context)
 
 
+@require_safe
+def shipment_image(request, name):
+    # Stored names never change content, so they can be cached for good.
+    # The file itself is sent by the front server when one is configured.
+    found = resolve_image(name)
+    if found is None:
+        raise Http404('No such image')
+    path, content_type, final = found
+    header = settings.IMAGE_SENDFILE_HEADER
+    if header == 'X-Accel-Redirect':
+        response = HttpResponse(content_type=content_type)
+        relative = os.path.relpath(path, settings.IMAGE_STORE_ROOT).replace(os.sep, '/')
+        response[header] = settings.IMAGE_ACCEL_PREFIX + relative
+    elif header:
+        response = HttpResponse(content_type=content_type)
+        response[header] = os.path.abspath(path)
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    if final:
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        # Variant not made yet, the original stands in for a moment
+        response['Cache-Control'] = 'public, max-age=60'
+    return response
+
+
 class PackagingView(LoginRequiredMixin, FormView):
     template_name = 'packaging.html'
     form_class = PackagingForm
-    success_url = reverse_lazy('payment', kwargs={'shipment_id': None})
+    success_url = reverse_lazy('payment')
 
     def form_valid(self, form):
-        packaging_type = form.cleaned_data['packaging_type']
-        quantity = form.cleaned_data['quantity']
-        weight = form.cleaned_data['weight']
-        length = form.cleaned_data['length']
-        width = form.cleaned_data['width']
-        height = form.cleaned_data['height']
-
-        packaging = Packaging.objects.create(
-            packaging_type=packaging_type,
-            quantity=quantity, 
-            weight=weight, 
-            length=length, 
-            width=width, 
-            height=height,
-        )
-        # update the packaging foreign key of the shipment object
-        shipment_id = self.kwargs['shipment_id']
-        shipment = get_object_or_404(Shipment, id=shipment_id)
-        shipment.packaging = packaging
-        shipment.save()
-        self.success_url = reverse_lazy('payment', kwargs={'shipment_id': shipment.pk})
+        draft = get_draft(self.request)
+        step = missing_step(draft, 'packaging')
+        if step is not None:
+            return redirect(step)
+        save_step(draft, 'packaging', form_data(form))
         return super().form_valid(form)
 
     def get_context_data(self, **kwargs):
@@ -670,8 +619,13 @@ class ManageShipmentView(LoginRequiredMixin, ListView):
         return queryset.filter(package__sender=self.request.user)
 
     def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['shipments'] = self.get_queryset()
+        # Keyset pages instead of OFFSET so deep pages cost the same as the
+        # first, fetched as projected rows joined in the same query
+        shipments, next_cursor = keyset_page(
+            self.object_list, self.request.GET.get('cursor'), settings.MANAGE_SHIPMENTS_PAGE_SIZE, ShipmentListRow,
+        )
+        context = super().get_context_data(object_list=shipments, **kwargs)
+        context['next_cursor'] = next_cursor
         return context
 
 class EditShipmentView(LoginRequiredMixin, UpdateView):
@@ -783,7 +737,11 @@ class EditShipmentDetailsView(LoginRequiredMixin, UpdateView):
     def form_valid(self, form):
         print("Edit Shipment Detials Form is Valid")
         form.instance.staus = 'Pending'
-        return super().form_valid(form)
+        response = super().form_valid(form)
+        # A status edited by hand goes through the event log like any other change
+        if 'status' in form.changed_data:
+            self.object.record_event(self.object.status)
+        return response
 
 @login_required
 def cancel_shipment(request, package_id):
@@ -791,14 +749,13 @@ def cancel_shipment(request, package_id):
     shipment = get_object_or_404(Shipment, package=package)
 
     # If the shipment is already canceled, redirect to the shipment list page
-    if shipment.status == 'Canceled':
+    if shipment.status == ShipmentEvent.CANCELED:
         return redirect('dashboard')
 
     # Delete the associated package from the database
 
-    # Update the status of the shipment to 'Canceled' and save it
-    shipment.status = 'Canceled'
-    shipment.save()
+    # Record the cancellation so anything following the shipment sees it
+    shipment.record_event(ShipmentEvent.CANCELED)
 
     # Delete the shipment from the database
     shipment.delete()
@@ -817,14 +774,110 @@ class TrackShipmentView(LoginRequiredMixin, View):
     def post(self, request, *args, **kwargs):
         try:
             package_id = request.POST.get('package_id')
-            package = Package.objects.get(package_id=package_id)
-            shipment = Shipment.objects.get(package=package)  # add this line
-            context = {'package': package, 'shipment': shipment}  # modify this line
+            package, shipment = get_tracking(package_id)
+            context = {'package': package, 'shipment': shipment}
+            if shipment is not None:
+                # History is a range scan on the (shipment, timestamp) index
+                context['events'] = shipment.events.order_by('timestamp')
             return render(request, self.template_name, context)
         except Package.DoesNotExist:
             return HttpResponseNotFound("Package not found")
 
 
+def tracking_last_modified(request, package_id):
+    if not hasattr(request, '_tracking_last_modified'):
+        request._tracking_last_modified = get_last_modified(package_id)
+    return request._tracking_last_modified
+
+def tracking_etag(request, package_id):
+    last_modified = tracking_last_modified(request, package_id)
+    if last_modified is None:
+        return None
+    return f"{package_id}-{last_modified.timestamp()}"
+
+@require_safe
+@cache_control(public=True, max_age=settings.TRACKING_API_MAX_AGE)
+@condition(etag_func=tracking_etag, last_modified_func=tracking_last_modified)
+def track_api(request, package_id):
+    # Public JSON tracking for partners; unchanged shipments get a 304
+    try:
+        package, shipment = get_tracking(package_id)
+    except Package.DoesNotExist:
+        return JsonResponse({'error': 'Package not found'}, status=404)
+    return JsonResponse(tracking_payload(package, shipment))
+
+
+async def track_stream(request, package_id):
+    # Server-sent events: the current status on connect, then every change
+    # as it is saved. Meant to be served by the ASGI app, where an idle
+    # connection costs a coroutine and a small queue rather than a thread.
+    # Django 4.2 doesn't notice when the client goes away, so each stream
+    # ends after TRACKING_STREAM_MAX_AGE and the browser reconnects. Under
+    # WSGI there is no stream at all: the status is sent once and the
+    # browser polls every TRACKING_STREAM_RETRY ms.
+    try:
+        package, shipment = await sync_to_async(get_tracking)(package_id)
+    except Package.DoesNotExist:
+        return JsonResponse({'error': 'Package not found'}, status=404)
+    initial = tracking_payload(package, shipment)
+    streaming = isinstance(request, ASGIRequest)
+
+    async def events():
+        yield f'retry: {settings.TRACKING_STREAM_RETRY}\n'
+        yield f'event: status\ndata: {json.dumps(initial)}\n\n'
+        if not streaming:
+            return
+        deadline = time.monotonic() + settings.TRACKING_STREAM_MAX_AGE
+        updates = get_broker().listen(package_id, heartbeat=settings.TRACKING_STREAM_HEARTBEAT)
+        try:
+            async for payload in updates:
+                if payload is None:
+                    yield ': keep-alive\n\n'
+                else:
+                    yield f'event: status\ndata: {json.dumps(payload)}\n\n'
+                if time.monotonic() >= deadline:
+                    break
+        finally:
+            # Unsubscribes now rather than whenever the generator is collected
+            await updates.aclose()
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # don't let nginx hold events back
+    return response
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def track_batch_api(request):
+    # Bulk status for integrations: POST {"package_ids": [...]} or GET ?ids=a,b,c
+    started = time.perf_counter()
+    if request.method == 'POST':
+        try:
+            package_ids = json.loads(request.body).get('package_ids')
+        except (ValueError, AttributeError):
+            package_ids = None
+    else:
+        package_ids = [package_id for package_id in request.GET.get('ids', '').split(',') if package_id]
+    if not isinstance(package_ids, list) or not all(isinstance(package_id, str) for package_id in package_ids):
+        return JsonResponse({'error': 'Expected a list of package ids'}, status=400)
+
+    package_ids = list(dict.fromkeys(package_ids))
+    if len(package_ids) > settings.TRACKING_BATCH_LIMIT:
+        return JsonResponse({'error': f'At most {settings.TRACKING_BATCH_LIMIT} package ids per request'}, status=400)
+
+    query_started = time.perf_counter()
+    results, missing = get_tracking_batch(package_ids)
+    query_time = time.perf_counter() - query_started
+
+    response = JsonResponse({'results': results, 'missing': missing})
+    response['Server-Timing'] = (
+        f'db;dur={query_time * 1000:.1f}, total;dur={(time.perf_counter() - started) * 1000:.1f}, '
+        f'batch;desc="{len(package_ids)} ids"'
+    )
+    return response
+
+
 class PaymentView(LoginRequiredMixin, FormView):
     template_name = 'payment.html'
     form_class = PaymentForm
@@ -832,94 +885,82 @@ class PaymentView(LoginRequiredMixin, FormView):
 
     
     def form_valid(self, form):
+        draft = get_draft(self.request)
+        step = missing_step(draft, None)
+        if step is not None:
+            messages.error(self.request, 'Your shipment is missing some details.')
+            return redirect(step)
+
         # Get the form data
-        card_type = form.cleaned_data['card_type']
-        card_brand = form.cleaned_data['card_brand']
-        cardholder_name = form.cleaned_data['cardholder_name']
-        card_number = form.cleaned_data['card_number']
-        card_expiry_month = form.cleaned_data['card_expiry_month']
-        card_expiry_year = form.cleaned_data['card_expiry_year']
-        card_cvv = form.cleaned_data['card_cvv']
-
-        # Check if payment with the same details already exists in the database
-        payment_qs = Payment.objects.filter(
-            card_type=card_type,
-            card_brand=card_brand,
-            cardholder_name=cardholder_name,
-            card_number=card_number,
-            card_expiry_month=card_expiry_month,
-            card_expiry_year=card_expiry_year,
-            card_cvv=card_cvv,
-        )
-        if payment_qs.exists():
-            # Payment already exists, use the existing payment object
-            payment = payment_qs.first()
-        else:
-            # Payment doesn't exist, create a new payment object and save it to the database
-            payment = Payment.objects.create(
-                card_type=card_type,
-                card_brand=card_brand,
-                cardholder_name=cardholder_name,
-                card_number=card_number,
-                card_expiry_month=card_expiry_month,
-                card_expiry_year=card_expiry_year,
-                card_cvv=card_cvv,
-            )
-
-        shipment_id = self.kwargs['shipment_id']
-        shipment = get_object_or_404(Shipment, id=shipment_id)
-        shipment.payment = payment
-        shipment.save()
+        payment_values = {
+            'card_type': form.cleaned_data['card_type'],
+            'card_brand': form.cleaned_data['card_brand'],
+            'cardholder_name': form.cleaned_data['cardholder_name'],
+            'card_number': form.cleaned_data['card_number'],
+            'card_expiry_month': form.cleaned_data['card_expiry_month'],
+            'card_expiry_year': form.cleaned_data['card_expiry_year'],
+        }
 
-        # Send email if payment successful
-        if card_cvv == 123:
-            # # Render the email template with context
-            # context = {'shipment_id': shipment_id, 'payment_id': payment.id}
-            # email_body = render_to_string('payment_successful_email.html', context)
-
-            # # Send the email
-            # send_mail(
-            #     subject='Payment Successful',
-            #     message='Your Shipment has been successfully created, and you will be forwarded more details regarding your shipment',
-            #     from_email=settings.EMAIL_HOST_USER,
-            #     recipient_list=['bathanygeorge@gmail.com'],
-            #     fail_silently=False,
-            # )
-            print("Shipment Confirmation Email has been sent")
-            shipment.status = 'Successful'
-            shipment.save()
-
-            messages.success(self.request, 'Your payment was successful.')
-            return redirect('payment_success')
-        else:
+        if form.cleaned_data['card_cvv'] != 123:
+            # Declined, the draft is kept so the user can try another card
             messages.error(self.request, 'Your payment was declined.')
+            return super().form_valid(form)
 
-        # Redirect to the dashboard
-        return super().form_valid(form)
+        # Re-check every step with the same forms before writing anything
+        step_forms = {
+            'checkout': CheckoutForm(data=draft.data['checkout'], request=self.request),
+            'shipment': ShipmentForm(data=draft.data['shipment']),
+            'packaging': PackagingForm(data=draft.data['packaging']),
+        }
+        for step, step_form in step_forms.items():
+            if not step_form.is_valid():
+                messages.error(self.request, 'Please check your shipment details again.')
+                return redirect(dict(DRAFT_STEPS)[step])
+
+        shipment = commit_draft(self.request, draft, step_forms['checkout'], step_forms['shipment'], step_forms['packaging'], payment_values)
+        self.request.session['package_id'] = shipment.package.package_id
+
+        # Send email if payment successful
+        # # Render the email template with context
+        # context = {'shipment_id': shipment.pk, 'payment_id': shipment.payment_id}
+        # email_body = render_to_string('payment_successful_email.html', context)
+
+        # # Send the email
+        # send_mail(
+        #     subject='Payment Successful',
+        #     message='Your Shipment has been successfully created, and you will be forwarded more details regarding your shipment',
+        #     from_email=settings.EMAIL_HOST_USER,
+        #     recipient_list=['bathanygeorge@gmail.com'],
+        #     fail_silently=False,
+        # )
+        print("Shipment Confirmation Email has been sent")
+        messages.success(self.request, 'Your payment was successful.')
+        return redirect('payment_success')
 
 @login_required
 def payment_success(request):
     return render(request, "payment_successful_email.html")
 
-@login_required
-def news(request):
-    url = "https://newsapi.org/v2/top-headlines"
-    params = {
-        "apiKey": "49d74ef14f3f44a69551d0325b121582",
-        "category": "general",
-    }
-    keywords = ["delivery", "shipping", "logistics", "fulfillment", "couriers", "packages", "parcels", "express", "commerce", "supply "]
-    all_articles = []
+def news_feed_state(request):
+    # Shared by the ETag and Last-Modified checks so the feed is only inspected once
+    if not hasattr(request, '_news_feed_state'):
+        request._news_feed_state = feed_state()
+    return request._news_feed_state
 
-    for keyword in keywords:
-        params["q"] = keyword
-        response = requests.get(url, params=params)
-        if "articles" in response.json():
-            articles = response.json()["articles"]
-            all_articles += articles
+def news_etag(request):
+    count, last_modified = news_feed_state(request)
+    return f"{count}-{last_modified.timestamp() if last_modified else 0}"
 
+def news_last_modified(request):
+    return news_feed_state(request)[1]
+
+@login_required
+@cache_control(private=True, max_age=0, must_revalidate=True)
+@condition(etag_func=news_etag, last_modified_func=news_last_modified)
+def news(request):
+    # Articles are stored by the refresh_news command, nothing is fetched here
     context = {
-        "articles": all_articles
+        "articles": NewsArticle.objects.order_by("-published_at")[:settings.NEWS_PAGE_SIZE]
     }
 
     return render(request, "news.html", context)
@@ -942,11 +983,29 @@ class LocationDetailView(LoginRequiredMixin, DetailView):
     template_name = 'location_detail.html'
 
 
+class PackageCountByLocationView(LoginRequiredMixin, ListView):
+    # Reads the maintained aggregate, nothing is counted per request
+    model = PackageCountByLocation
+    template_name = 'package_count_by_location.html'
+    context_object_name = 'counts'
+
+    def get_queryset(self):
+        return PackageCountByLocation.objects.select_related('station').order_by('-count')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['country_counts'] = [row for row in context['counts'] if row.station_id is None]
+        context['station_counts'] = [row for row in context['counts'] if row.station_id is not None]
+        return context
+
 class LocationListView(LoginRequiredMixin, ListView):
     model = Location
     template_name = 'location_list.html'
     paginate_by = 10
 
+    def get_queryset(self):
+        return project(Location.objects.order_by('pk'), LocationRow)
+
 @login_required
 def generate_pdf(request, pk):
     package = get_object_or_404(Package, pk=pk)